@@ -0,0 +1,318 @@
+import atexit
+import dataclasses
+import hashlib
+import json
+import logging
+import pathlib
+import re
+import threading
+import zlib
+from collections.abc import Generator, Iterator
+
+# ---------- archive settings -----------------------------------------------
+ARCHIVE_DIR = pathlib.Path("archive")
+ARCHIVE_MAX_BYTES = 4 * 1024 * 1024  # これを超えたらセグメントをローテーション
+ARCHIVE_LEVEL = 6  # zlib の圧縮レベル
+GZIP_WBITS = 16 + zlib.MAX_WBITS  # gzip 形式のヘッダー・トレーラーを付ける
+READ_SIZE = 64 * 1024
+
+CURRENT_SEGMENT = "observations.jsonl.gz"
+ROTATED_SEGMENT = re.compile(r"observations-(\d+)\.jsonl\.gz")
+# ---------------------------------------------------------------------------
+
+
+@dataclasses.dataclass
+class Observation:
+    """1 回のチェックで観測した内容
+
+    チェック処理は観測するだけで、スナップショットの保存・インデックスの更新・
+    アーカイブへの記録は呼び出し側が通知を送り終えてから行う。
+    """
+
+    target: str  # "public" または "talk"
+    started_at: float
+    fetch_seconds: float
+    curr: dict[str, list[str]]
+    new_ids: dict[str, list[str]] | None  # None は初回スキャン
+    changes: list[str]  # 通知に使う変更の説明
+    wire_bytes: int | None = None
+    body_bytes: int | None = None
+
+
+def snapshot_hash(snap: dict[str, list[str]]) -> str:
+    """スナップショットの内容から安定したハッシュを計算する"""
+    data = json.dumps(snap, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def record_observation(
+    target: str,
+    started_at: float,
+    fetch_seconds: float,
+    curr: dict[str, list[str]],
+    new_ids: dict[str, list[str]] | None,
+    wire_bytes: int | None = None,
+    body_bytes: int | None = None,
+    directory: pathlib.Path | None = None,
+) -> dict:
+    """1 サイクル分の観測結果をアーカイブに追記して返す
+
+    started_at はサイクル開始時刻（UNIX 時間）、fetch_seconds は取得〜解析に
+    かかった秒数。new_ids が None の場合は初回スキャンとして、curr の全 ID を
+    新着として記録する。wire_bytes / body_bytes は HTTP で取得した場合の
+    受信バイト数（圧縮のまま）と展開後のバイト数。
+    """
+    observation = {
+        "ts": round(started_at, 3),
+        "target": target,
+        "fetch_ms": round(fetch_seconds * 1000, 1),
+        "hash": snapshot_hash(curr),
+        "initial": new_ids is None,
+        "new_ids": new_ids if new_ids is not None else {
+            label: ids for label, ids in curr.items() if ids
+        },
+    }
+    if wire_bytes is not None:
+        observation["wire_bytes"] = wire_bytes
+    if body_bytes is not None:
+        observation["body_bytes"] = body_bytes
+    append_observation(observation, directory)
+    return observation
+
+
+class _SegmentWriter:
+    """現在のセグメントに 1 本の gzip ストリームとして追記する
+
+    行毎に Z_SYNC_FLUSH するので、書いた行はすぐにファイルから読めるが、圧縮の
+    辞書はストリーム全体で共有される。close するとストリームを終端する。
+    """
+
+    def __init__(self, path: pathlib.Path) -> None:
+        self.path = path
+        self._file = path.open("ab")
+        self._compressor = zlib.compressobj(ARCHIVE_LEVEL, zlib.DEFLATED, GZIP_WBITS)
+
+    @property
+    def size(self) -> int:
+        return self._file.tell()
+
+    def write(self, data: bytes) -> None:
+        self._file.write(
+            self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        )
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.write(self._compressor.flush(zlib.Z_FINISH))
+        self._file.close()
+
+
+_writers: dict[pathlib.Path, _SegmentWriter] = {}
+_writers_lock = threading.RLock()
+
+
+def close_segments() -> None:
+    """開いているセグメントの gzip ストリームを終端して閉じる（終了時に自動で呼ばれる）"""
+    with _writers_lock:
+        while _writers:
+            _, writer = _writers.popitem()
+            writer.close()
+
+
+atexit.register(close_segments)
+
+
+def _close_segment(current: pathlib.Path) -> None:
+    with _writers_lock:
+        writer = _writers.pop(current.resolve(), None)
+        if writer is not None:
+            writer.close()
+
+
+def append_observation(observation: dict, directory: pathlib.Path | None = None) -> None:
+    """観測結果を 1 行の JSON として現在のセグメントに追記する
+
+    プロセス毎にセグメントへ 1 本の gzip ストリーム（メンバー）を開いたままにして
+    行毎にフラッシュする。前のプロセスが終端せずに終わったセグメント（強制終了など）
+    には新しいメンバーを続けられないので、先にローテーションする。
+    directory を省略すると ARCHIVE_DIR を使う（以下の関数も同様）。
+    """
+    directory = directory or ARCHIVE_DIR
+    current = directory / CURRENT_SEGMENT
+    line = json.dumps(observation, ensure_ascii=False) + "\n"
+    with _writers_lock:
+        writer = _writers.get(current.resolve())
+        if writer is not None and writer.size >= ARCHIVE_MAX_BYTES:
+            rotate_segment(directory)
+            writer = None
+        if writer is None:
+            directory.mkdir(parents=True, exist_ok=True)
+            if current.exists() and (
+                current.stat().st_size >= ARCHIVE_MAX_BYTES or not _is_complete(current)
+            ):
+                rotate_segment(directory)
+            writer = _writers[current.resolve()] = _SegmentWriter(current)
+        writer.write(line.encode("utf-8"))
+
+
+def rotate_segment(directory: pathlib.Path | None = None) -> pathlib.Path | None:
+    """現在のセグメントを閉じて連番付きのファイル名に退避する"""
+    directory = directory or ARCHIVE_DIR
+    current = directory / CURRENT_SEGMENT
+    _close_segment(current)
+    if not current.exists():
+        return None
+    numbers = [
+        int(m.group(1))
+        for p in directory.iterdir()
+        if (m := ROTATED_SEGMENT.fullmatch(p.name))
+    ]
+    rotated = directory / f"observations-{max(numbers, default=0) + 1:06d}.jsonl.gz"
+    logging.info("Rotating archive segment to %s", rotated.name)
+    current.replace(rotated)
+    return rotated
+
+
+def _decompress_segment(path: pathlib.Path) -> Generator[bytes, None, bool]:
+    """連結された gzip メンバーを順に展開して返す
+
+    書き込み中のセグメントは最後のメンバーが終端されていないので、途中までを返す。
+    戻り値は最後のメンバーが終端されているか。壊れたデータでは zlib.error を送出する。
+    """
+    decompressor = zlib.decompressobj(GZIP_WBITS)
+    started = False
+    with path.open("rb") as f:
+        while chunk := f.read(READ_SIZE):
+            while chunk:
+                started = True
+                before = decompressor.copy()
+                try:
+                    yield decompressor.decompress(chunk)
+                except zlib.error:
+                    # 壊れている位置の手前までは 1 バイトずつ展開し直して返す
+                    for i in range(len(chunk)):
+                        yield before.decompress(chunk[i : i + 1])
+                    raise
+                if not decompressor.eof:
+                    break
+                # 次のメンバー
+                chunk = decompressor.unused_data
+                decompressor = zlib.decompressobj(GZIP_WBITS)
+                started = False
+    return not started
+
+
+def _is_complete(path: pathlib.Path) -> bool:
+    """セグメントの最後のメンバーが終端されていて、続けて追記できるか"""
+    chunks = _decompress_segment(path)
+    try:
+        while True:
+            next(chunks)
+    except StopIteration as stop:
+        return stop.value
+    except zlib.error:
+        return False
+
+
+def segments(directory: pathlib.Path | None = None) -> list[pathlib.Path]:
+    """セグメントを古い順に返す（ローテーション済み → 現在）"""
+    directory = directory or ARCHIVE_DIR
+    if not directory.is_dir():
+        return []
+    rotated = sorted(
+        (int(m.group(1)), p)
+        for p in directory.iterdir()
+        if (m := ROTATED_SEGMENT.fullmatch(p.name))
+    )
+    paths = [p for _, p in rotated]
+    current = directory / CURRENT_SEGMENT
+    if current.exists():
+        paths.append(current)
+    return paths
+
+
+def iter_observations(
+    target: str | None = None, directory: pathlib.Path | None = None
+) -> Iterator[dict]:
+    """アーカイブの観測結果を古い順に 1 件ずつ返す（全体をメモリに載せない）"""
+    for path in segments(directory):
+        buffer = b""
+        try:
+            for data in _decompress_segment(path):
+                *lines, buffer = (buffer + data).split(b"\n")
+                for line in lines:
+                    try:
+                        observation = json.loads(line)
+                    except json.JSONDecodeError:
+                        logging.warning("Skipping corrupted line in %s", path.name)
+                        continue
+                    if target is None or observation.get("target") == target:
+                        yield observation
+        except zlib.error:
+            # 書き込み途中で途切れた末尾のメンバーは読み飛ばす
+            logging.warning("%s is truncated, skipping the rest", path.name)
+
+
+def first_seen(
+    since: float,
+    until: float,
+    target: str | None = None,
+    directory: pathlib.Path | None = None,
+) -> Iterator[tuple[float, str, str, str]]:
+    """since <= 初出時刻 < until の項目を (ts, target, label, id) で返す
+
+    保持するのは既出 ID の集合だけなので、メモリ使用量は観測数ではなく
+    項目数に比例する。
+    """
+    seen: set[tuple[str, str, str]] = set()
+    for observation in iter_observations(target, directory):
+        ts = observation["ts"]
+        for label, ids in observation["new_ids"].items():
+            for item_id in ids:
+                key = (observation["target"], label, item_id)
+                if key in seen:
+                    continue
+                seen.add(key)
+                if since <= ts < until:
+                    yield ts, observation["target"], label, item_id
+
+
+def detection_latencies(
+    target: str | None = None, directory: pathlib.Path | None = None
+) -> list[float]:
+    """新着を検出したサイクル毎の最大検出遅延（秒）を返す
+
+    新着は直前の観測の開始時刻以降に公開されたはずなので、
+    「今回の取得完了時刻 − 直前の観測の開始時刻」が検出遅延の上限になる。
+    初回スキャンと直前の観測が無いものは除く。
+    """
+    last_ts: dict[str, float] = {}
+    latencies: list[float] = []
+    for observation in iter_observations(target, directory):
+        name = observation["target"]
+        ts = observation["ts"]
+        prev_ts = last_ts.get(name)
+        last_ts[name] = ts
+        if prev_ts is None or observation["initial"] or not observation["new_ids"]:
+            continue
+        latencies.append(ts + observation["fetch_ms"] / 1000 - prev_ts)
+    return latencies
+
+
+def latency_summary(latencies: list[float]) -> dict[str, float]:
+    """検出遅延の分布を要約する（件数・最小・p50・p90・p99・最大）"""
+    if not latencies:
+        return {"count": 0}
+    values = sorted(latencies)
+
+    def percentile(q: float) -> float:
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+    return {
+        "count": len(values),
+        "min": values[0],
+        "p50": percentile(0.50),
+        "p90": percentile(0.90),
+        "p99": percentile(0.99),
+        "max": values[-1],
+    }
@@ -0,0 +1,196 @@
+import argparse
+import asyncio
+import datetime
+import logging
+import os
+import pathlib
+import sys
+import time
+
+from dotenv import load_dotenv
+
+from hiyolabbot import archive, talk_watcher, watcher
+
+# ---------- exit codes (diff(1) と同じ規約) -----------------------------------
+EXIT_OK = 0  # 変更なし（初回スキャンを含む）
+EXIT_CHANGED = 1  # いずれかの対象で新着あり
+EXIT_ERROR = 2  # 取得・解析に失敗した対象がある
+# ---------------------------------------------------------------------------
+
+TARGETS = ("public", "talk")
+
+
+def run_check(targets: list[str], save: bool = False) -> int:
+    """指定された対象について 1 サイクルだけ監視を実行し、終了コードを返す
+
+    通知は送らないので、既定では新着を検出するだけでスナップショットは更新しない。
+    save=True の場合は既出として保存する（Bot が再起動してもその新着は通知されない）。
+    """
+    status = EXIT_OK
+    for target in targets:
+        try:
+            if target == "public":
+                observation = watcher.check_updates()
+                if save:
+                    watcher.commit_updates(observation)
+                initial = [watcher.INITIAL_SCAN]
+            else:
+                plusmember_id = os.environ.get("PLUSMEMBER_ID")
+                password = os.environ.get("PLUSMEMBER_PASSWORD")
+                if not (plusmember_id and password):
+                    raise RuntimeError(
+                        "PLUSMEMBER_ID / PLUSMEMBER_PASSWORD が設定されていません"
+                    )
+                observation = asyncio.run(
+                    talk_watcher.check_talk_updates(plusmember_id, password)
+                )
+                if save:
+                    talk_watcher.commit_talk_updates(observation)
+                initial = [talk_watcher.TALK_INITIAL_SCAN]
+        except Exception as e:
+            print(f"{target}: error: {e}", file=sys.stderr)
+            status = EXIT_ERROR
+            continue
+
+        changes = observation.changes
+        if changes and changes != initial:
+            print(f"{target}: {', '.join(changes)}")
+            if status == EXIT_OK:
+                status = EXIT_CHANGED
+        else:
+            print(f"{target}: {changes[0] if changes else '変更なし'}")
+    return status
+
+
+def run_replay(directory: pathlib.Path, pattern: str = "*.html", quiet: bool = False) -> int:
+    """記録済み HTML を名前順に make_snapshot / diff へ流し、差分とスループットを表示する
+
+    ネットワーク・Discord・スナップショットファイルには一切触れない。
+    """
+    if not directory.is_dir():
+        print(f"{directory}: ディレクトリが見つかりません", file=sys.stderr)
+        return EXIT_ERROR
+    pages = sorted(p for p in directory.glob(pattern) if p.is_file())
+    if not pages:
+        print(f"{directory}: {pattern} に一致するファイルがありません", file=sys.stderr)
+        return EXIT_ERROR
+
+    prev: dict[str, list[str]] | None = None
+    changed = 0
+    started = time.perf_counter()
+    for page in pages:
+        curr = watcher.make_snapshot(watcher.parse_html(page.read_bytes()))
+        changes = watcher.diff(prev, curr)
+        if prev is not None and changes:
+            changed += 1
+            if not quiet:
+                print(f"{page.name}: {', '.join(changes)}")
+        prev = curr
+    elapsed = time.perf_counter() - started
+
+    rate = len(pages) / elapsed if elapsed > 0 else float("inf")
+    print(
+        f"{len(pages)} pages, {changed} with changes, "
+        f"{elapsed:.3f}s ({rate:.1f} pages/s)"
+    )
+    return EXIT_OK
+
+
+def _parse_time(value: str) -> float:
+    """ISO 8601 形式の日時（タイムゾーン省略時はローカル時刻）を UNIX 時間に変換する"""
+    return datetime.datetime.fromisoformat(value).timestamp()
+
+
+def _format_time(ts: float) -> str:
+    return datetime.datetime.fromtimestamp(ts).isoformat(timespec="seconds")
+
+
+def run_history(args: argparse.Namespace) -> int:
+    """アーカイブに対する問い合わせを実行する"""
+    if args.query == "first-seen":
+        since = _parse_time(args.since) if args.since else 0.0
+        until = _parse_time(args.until) if args.until else float("inf")
+        for ts, target, label, item_id in archive.first_seen(
+            since, until, args.target, args.archive_dir
+        ):
+            print(f"{_format_time(ts)}\t{target}\t{label}\t{item_id}")
+        return EXIT_OK
+
+    summary = archive.latency_summary(archive.detection_latencies(args.target, args.archive_dir))
+    if not summary["count"]:
+        print("新着を検出した観測がありません")
+        return EXIT_OK
+    print(f"count: {summary['count']}")
+    for key in ("min", "p50", "p90", "p99", "max"):
+        print(f"{key}: {summary[key]:.1f}s")
+    return EXIT_OK
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="hiyolabbot",
+        description="ひよラボの更新チェック・記録済みページの再生・観測履歴の問い合わせ",
+    )
+    parser.add_argument(
+        "-v", "--verbose", action="store_true", help="INFO ログを表示する"
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    check = sub.add_parser(
+        "check",
+        help="1 サイクルだけ監視して終了する (0: 変更なし, 1: 新着あり, 2: エラー)",
+    )
+    check.add_argument(
+        "-t",
+        "--target",
+        dest="targets",
+        action="append",
+        choices=TARGETS,
+        help="監視対象（複数指定可、既定: public）",
+    )
+    check.add_argument(
+        "--commit",
+        action="store_true",
+        help="スナップショットを保存し、アーカイブに記録する（新着は通知されないまま既出になる）",
+    )
+
+    replay = sub.add_parser(
+        "replay", help="記録済み HTML をオフラインで make_snapshot / diff に流す"
+    )
+    replay.add_argument("directory", type=pathlib.Path)
+    replay.add_argument(
+        "--glob", default="*.html", help="対象ファイルのパターン（既定: *.html）"
+    )
+    replay.add_argument(
+        "-q", "--quiet", action="store_true", help="ページ毎の差分を表示しない"
+    )
+
+    history = sub.add_parser("history", help="観測アーカイブを問い合わせる")
+    history.add_argument(
+        "--archive-dir",
+        type=pathlib.Path,
+        help=f"アーカイブのディレクトリ（既定: {archive.ARCHIVE_DIR}）",
+    )
+    history.add_argument("-t", "--target", choices=TARGETS, help="対象を絞り込む")
+    queries = history.add_subparsers(dest="query", required=True)
+    seen = queries.add_parser("first-seen", help="指定期間に初めて観測された項目を表示する")
+    seen.add_argument("--since", help="開始日時（ISO 8601、この時刻を含む）")
+    seen.add_argument("--until", help="終了日時（ISO 8601、この時刻を含まない）")
+    queries.add_parser("latency", help="検出遅延（上限）の分布を表示する")
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+
+    if args.command == "check":
+        load_dotenv()
+        return run_check(args.targets or ["public"], save=args.commit)
+    if args.command == "history":
+        return run_history(args)
+    return run_replay(args.directory, args.glob, args.quiet)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
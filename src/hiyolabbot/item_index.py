@@ -0,0 +1,92 @@
+import bisect
+import sys
+from array import array
+
+
+class ItemIndex:
+    """ラベル毎の既出 ID をメモリ上に保持する差分検出用インデックス
+
+    監視ループはこのインデックスをサイクルをまたいで保持するため、毎回
+    スナップショットを読み直して set を作り直す必要がない。スナップショット JSON は
+    従来どおり文字列のリストのまま保存する。
+
+    numeric=True の場合（トークのコメント ID のように数字だけの ID）は、ラベル毎に
+    1 件あたり 8 バイトのソート済み array("q") で保持し、差分は int に変換した ID の
+    集合との差で求める（変換も差分も C で行われる）。それ以外（href）は文字列の
+    frozenset で保持する。href を数字に変換する処理は Python のループになり、
+    件数の少ない公開ページでは文字列の集合より遅くなるため。
+    """
+
+    def __init__(self, numeric: bool = False) -> None:
+        self.numeric = numeric
+        self._ids: dict[str, array | frozenset[str]] = {}
+        # new_items で変換した数値 ID（update で同じリストを渡されたら使い回す）
+        self._parsed: dict[str, tuple[list[str], list[int], set[int]]] = {}
+        self.initialized = False
+
+    @classmethod
+    def from_snapshot(
+        cls, snap: dict[str, list[str]] | None, numeric: bool = False
+    ) -> "ItemIndex":
+        """スナップショットからインデックスを作る（numeric で数字以外の ID は ValueError）"""
+        index = cls(numeric)
+        if snap is not None:
+            index.update(snap)
+        return index
+
+    def contains(self, label: str, item_id: str) -> bool:
+        ids = self._ids.get(label)
+        if not ids:
+            return False
+        if not self.numeric:
+            return item_id in ids
+        number = int(item_id)
+        pos = bisect.bisect_left(ids, number)
+        return pos < len(ids) and ids[pos] == number
+
+    def _parse(self, label: str, ids: list[str]) -> tuple[list[str], list[int], set[int]]:
+        parsed = self._parsed.get(label)
+        if parsed is None or parsed[0] is not ids:
+            numbers = list(map(int, ids))
+            parsed = self._parsed[label] = (ids, numbers, set(numbers))
+        return parsed
+
+    def new_items(self, curr: dict[str, list[str]]) -> dict[str, list[str]]:
+        """ラベル毎にインデックスに存在しない ID を curr の順序のまま返す"""
+        new_ids: dict[str, list[str]] = {}
+        for label, curr_ids in curr.items():
+            seen = self._ids.get(label, ())
+            if not self.numeric:
+                added = [i for i in curr_ids if i not in seen]
+            else:
+                _, numbers, unique = self._parse(label, curr_ids)
+                missing = unique.difference(seen)
+                # 新着がある場合だけ元の文字列に戻す
+                added = [i for i, n in zip(curr_ids, numbers) if n in missing] if missing else []
+            if added:
+                new_ids[label] = added
+        return new_ids
+
+    def update(self, snap: dict[str, list[str]]) -> None:
+        """インデックスの内容をスナップショットの内容で置き換える"""
+        if self.numeric:
+            self._ids = {
+                label: array("q", sorted(self._parse(label, ids)[2]))
+                for label, ids in snap.items()
+            }
+        else:
+            self._ids = {label: frozenset(ids) for label, ids in snap.items()}
+        self._parsed.clear()
+        self.initialized = True
+
+    def __len__(self) -> int:
+        return sum(len(ids) for ids in self._ids.values())
+
+    @property
+    def nbytes(self) -> int:
+        """保持している ID のおおよそのバイト数"""
+        if self.numeric:
+            return sum(ids.itemsize * len(ids) for ids in self._ids.values())
+        return sum(
+            sys.getsizeof(ids) + sum(map(sys.getsizeof, ids)) for ids in self._ids.values()
+        )
@@ -1,14 +1,12 @@
 import asyncio
 import os
-from datetime import datetime
-from urllib.parse import urljoin
 
 import discord
-import requests
+from discord import app_commands
 from dotenv import load_dotenv
-from talk_watcher import check_talk_updates
 from tweepy import Client
-from watcher import URL, diff, fetch_html, load_previous, make_snapshot, save_snapshot
+
+from hiyolabbot.monitor import Monitor
 
 from linebot.v3.messaging import (
     Configuration,
@@ -22,6 +20,7 @@ load_dotenv()
 
 intents = discord.Intents.default()
 client = discord.Client(intents=intents)
+tree = app_commands.CommandTree(client)
 
 x_client = Client(
     bearer_token=os.environ.get("X_BEARER_TOKEN"),
@@ -46,10 +45,20 @@ def _broadcast_line_message(message: str) -> None:
 
 # Ensure the background task starts only once
 _watch_task: asyncio.Task | None = None
+_monitor: Monitor | None = None
+_commands_synced = False
 
 
 async def watch_loop() -> None:
+    global _monitor
     await client.wait_until_ready()
+    # on_ready で再起動された場合は既存の Monitor を使い続け、統計とインデックスを引き継ぐ
+    if _monitor is None:
+        _monitor = _create_monitor()
+    await _monitor.run_forever(CHECK_INTERVAL, client.is_closed)
+
+
+def _create_monitor() -> Monitor:
     channel_id = int(os.environ["CHANNEL_ID"])
     channel = client.get_channel(channel_id)
     if channel is None:
@@ -67,124 +76,50 @@ async def watch_loop() -> None:
     plusmember_id = os.environ.get("PLUSMEMBER_ID")
     plusmember_password = os.environ.get("PLUSMEMBER_PASSWORD")
 
-    while not client.is_closed():
-        # 公開ページの監視
-        try:
-            curr = make_snapshot(fetch_html())
-            prev = load_previous()
-            changes = diff(prev, curr)
-        except requests.exceptions.RequestException as e:
-            await dev_channel.send(f"HTMLの取得に失敗しました: {e}")
-            await asyncio.sleep(CHECK_INTERVAL)
-            continue
-        except Exception as e:
-            await dev_channel.send(f"公開ページの監視中にエラーが発生しました: {e}")
-            await asyncio.sleep(CHECK_INTERVAL)
-            continue
-        if changes and changes != ["初回スキャン（スナップショット作成）"]:
-            change_descriptions = "\n".join(f"• {c}" for c in changes)
-            msg = (
-                "@everyone\n"
-                f"ひよラボが更新されました！\n"
-                f"以下のセクションに変更がありました:\n{change_descriptions}\n"
-                f"{URL}\n"
-            )
-            await channel.send(msg)
-
-            # https://hamagishihiyori.fanpla.jp/?t=202505030444 のように timestamp を含む URL を使用する
-            # 理由:
-            #   こうすることで同じ内容のツイートではないと判定されて POST に失敗することがなくなる。
-            #   また、t=xxx を含めても遷移先は https://hamagishihiyori.fanpla.jp/ にリダイレクトされる。
-            #   その結果、ツイートのプレビューは https://hamagishihiyori.fanpla.jp/ のものになり、きれいに表示される。
-            timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-            x_link = urljoin(URL, f"?t={timestamp}")
-            x_msg = (
-                "／\n"
-                "📢 ひよラボが更新されました！\n"
-                "＼\n"
-                "以下のセクションが更新されました:\n"
-                f"{change_descriptions}\n\n"
-                "#HiyoLab\n"
-                "#ひよラボ\n"
-                "#濱岸ひより\n"
-                f"{x_link}"
-            )
-            try:
-                x_client.create_tweet(text=x_msg)
-            except Exception as e:
-                # 処理に失敗してもループを継続させる
-                await dev_channel.send(
-                    f"X に投稿に失敗しました: {e}\n投稿したかった文面:\n{x_msg}"
-                )
-
-            line_message = (
-                "ひよラボが更新されました！\n"
-                "以下のセクションに変更がありました:\n"
-                f"{change_descriptions}\n"
-                f"{URL}"
-            )
-            try:
-                _broadcast_line_message(line_message)
-            except Exception as e:
-                await dev_channel.send(
-                    f"LINE に投稿に失敗しました: {e}\n投稿したかった文面:\n{line_message}"
-                )
-
-        save_snapshot(curr)
-
-        # トークページの監視（認証情報がある場合のみ）
-        if plusmember_id and plusmember_password:
-            try:
-                talk_changes = await check_talk_updates(
-                    plusmember_id, plusmember_password
-                )
-                if talk_changes and talk_changes != [
-                    "トーク初回スキャン（スナップショット作成）"
-                ]:
-                    talk_msg = (
-                        "@everyone\n"
-                        "ひよりとーくが更新されました！\n"
-                        "https://hamagishihiyori.fanpla.jp/community/detail/55/?f=artist\n"
-                    )
-                    await channel.send(talk_msg)
-
-                    # Twitterにも投稿
-                    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-                    x_talk_link = f"https://hamagishihiyori.fanpla.jp/community/detail/55/?f=artist&t={timestamp}"
-                    x_talk_msg = (
-                        "／\n"
-                        "💬 ひよりとーくが更新されました！\n"
-                        "＼\n\n"
-                        "#ひよりとーく\n"
-                        "#ひよラボ\n"
-                        "#HiyoLab\n"
-                        "#濱岸ひより\n"
-                        f"{x_talk_link}"
-                    )
-                    try:
-                        x_client.create_tweet(text=x_talk_msg)
-                    except Exception as e:
-                        await dev_channel.send(
-                            f"X にトーク更新の投稿に失敗しました: {e}\n投稿したかった文面:\n{x_talk_msg}"
-                        )
-
-                    line_talk_message = (
-                        "ひよりとーくが更新されました！\n"
-                        "https://hamagishihiyori.fanpla.jp/community/detail/55/?f=artist"
-                    )
-                    try:
-                        _broadcast_line_message(line_talk_message)
-                    except Exception as e:
-                        await dev_channel.send(
-                            f"LINE にトーク更新の投稿に失敗しました: {e}\n投稿したかった文面:\n{line_talk_message}"
-                        )
-
-            except Exception as e:
-                await dev_channel.send(
-                    f"トークページの監視中にエラーが発生しました: {e}"
-                )
-
-        await asyncio.sleep(CHECK_INTERVAL)
+    return Monitor(
+        channel,
+        dev_channel,
+        x_client,
+        _broadcast_line_message,
+        plusmember_id,
+        plusmember_password,
+    )
+
+
+# ---------- application commands ------------------------------------------
+# 応答はすべてメモリ上の状態から作り、/status と /stats はディスクやネットワークに触れない
+
+
+@tree.command(name="check", description="今すぐ更新をチェックする")
+@app_commands.default_permissions(manage_guild=True)
+async def check_command(interaction: discord.Interaction) -> None:
+    if _monitor is None:
+        await interaction.response.send_message("まだ起動中です", ephemeral=True)
+        return
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    # 失敗しても必ずフォローアップを送り、「考え中…」のまま残さない
+    try:
+        result = await _monitor.request_cycle("manual")
+        message = _monitor.describe_result(result)
+    except Exception as e:
+        message = f"チェック中にエラーが発生しました: {e}"
+    await interaction.followup.send(message, ephemeral=True)
+
+
+@tree.command(name="status", description="監視ループの状態と前回のサイクルの所要時間を表示する")
+async def status_command(interaction: discord.Interaction) -> None:
+    if _monitor is None:
+        await interaction.response.send_message("まだ起動中です", ephemeral=True)
+        return
+    await interaction.response.send_message(_monitor.describe_status(), ephemeral=True)
+
+
+@tree.command(name="stats", description="起動してからの監視の統計を表示する")
+async def stats_command(interaction: discord.Interaction) -> None:
+    if _monitor is None:
+        await interaction.response.send_message("まだ起動中です", ephemeral=True)
+        return
+    await interaction.response.send_message(_monitor.describe_stats(), ephemeral=True)
 
 
 @client.event
@@ -198,6 +133,18 @@ async def on_ready() -> None:
     else:
         print("watch_loop already running; skip starting a new one")
 
+    # on_ready は再接続の度に呼ばれるので、コマンドの同期は成功するまで 1 回だけ行う。
+    # 同期に失敗しても（applications.commands スコープが無い等）監視は止めない
+    global _commands_synced
+    if not _commands_synced:
+        try:
+            await tree.sync()
+        except discord.DiscordException as e:
+            print(f"failed to sync application commands: {e}")
+        else:
+            _commands_synced = True
+            print("application commands synced")
+
 
 if __name__ == "__main__":
     token = os.getenv("DISCORD_TOKEN")
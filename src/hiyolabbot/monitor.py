@@ -0,0 +1,384 @@
+import asyncio
+import dataclasses
+import logging
+import time
+from collections.abc import Awaitable, Callable
+from datetime import datetime
+from urllib.parse import urljoin
+
+import requests
+
+from hiyolabbot.archive import Observation
+from hiyolabbot.item_index import ItemIndex
+from hiyolabbot.talk_watcher import (
+    TALK_INITIAL_SCAN,
+    TALK_URL,
+    check_talk_updates,
+    commit_talk_updates,
+    load_talk_index,
+)
+from hiyolabbot.watcher import (
+    INITIAL_SCAN,
+    URL,
+    check_updates,
+    commit_updates,
+    load_index,
+)
+
+
+@dataclasses.dataclass
+class CycleResult:
+    """1 サイクル分の監視結果と所要時間"""
+
+    trigger: str  # "scheduled" または "manual"
+    started_at: float
+    seconds: float = 0.0
+    public_seconds: float | None = None
+    talk_seconds: float | None = None
+    changes: list[str] = dataclasses.field(default_factory=list)
+    talk_changes: list[str] = dataclasses.field(default_factory=list)
+    errors: list[str] = dataclasses.field(default_factory=list)
+
+
+@dataclasses.dataclass
+class MonitorStats:
+    """起動してからの累計（メモリ上のみ）"""
+
+    cycles: int = 0
+    manual_cycles: int = 0
+    shared_requests: int = 0  # 実行中のサイクルに合流した要求
+    failed_cycles: int = 0
+    notifications: int = 0
+
+
+class Monitor:
+    """公開ページ・トークページの監視サイクルと通知を実行する
+
+    サイクルは同時に 1 つしか実行しない。定期実行と /check などの手動実行が
+    重なった場合は、後から来た要求が実行中のサイクルの結果を共有する。
+    スナップショットの保存とインデックスの更新は Discord への通知が成功してから
+    行うので、通知に失敗した新着は次のサイクルで再び検出される。
+
+    通知先（channel / dev_channel / x_client / broadcast_line）、チェック・保存処理、
+    インデックス、時計と sleep は差し替えられるので、テストでは偽物を渡して
+    ループ全体を実時間を待たずに実行できる。
+    """
+
+    def __init__(
+        self,
+        channel,
+        dev_channel,
+        x_client,
+        broadcast_line: Callable[[str], None],
+        plusmember_id: str | None = None,
+        plusmember_password: str | None = None,
+        *,
+        check_public: Callable[..., Observation] = check_updates,
+        check_talk: Callable[..., Awaitable[Observation]] = check_talk_updates,
+        commit_public: Callable[..., None] = commit_updates,
+        commit_talk: Callable[..., None] = commit_talk_updates,
+        index: ItemIndex | None = None,
+        talk_index: ItemIndex | None = None,
+        clock: Callable[[], float] = time.time,
+        sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+    ) -> None:
+        self.channel = channel
+        self.dev_channel = dev_channel
+        self.x_client = x_client
+        self.broadcast_line = broadcast_line
+        self.plusmember_id = plusmember_id
+        self.plusmember_password = plusmember_password
+        self.check_public = check_public
+        self.check_talk = check_talk
+        self.commit_public = commit_public
+        self.commit_talk = commit_talk
+        self.clock = clock
+        self.sleep = sleep
+
+        # 既出 ID のインデックスはサイクルをまたいでメモリ上に保持する
+        self.index = index if index is not None else load_index()
+        # トークのインデックスは認証情報がある場合だけ読み込む
+        if talk_index is not None:
+            self.talk_index = talk_index
+        elif plusmember_id and plusmember_password:
+            self.talk_index = load_talk_index()
+        else:
+            self.talk_index = ItemIndex(numeric=True)
+
+        self.stats = MonitorStats()
+        self.last_result: CycleResult | None = None
+        self.next_run_at: float | None = None
+        self.waiting = 0  # 実行中のサイクルの完了を待っている要求の数
+        self._cycle: asyncio.Task | None = None
+        self._current: CycleResult | None = None
+
+    @property
+    def running(self) -> CycleResult | None:
+        """実行中のサイクル（無ければ None）"""
+        if self._cycle is None or self._cycle.done():
+            return None
+        return self._current
+
+    async def request_cycle(self, trigger: str = "scheduled") -> CycleResult:
+        """サイクルを実行して結果を返す。実行中のサイクルがあればその結果を待つ"""
+        if self._cycle is None or self._cycle.done():
+            self._current = CycleResult(trigger=trigger, started_at=self.clock())
+            self._cycle = asyncio.create_task(self._run_cycle(self._current))
+        else:
+            self.stats.shared_requests += 1
+        self.waiting += 1
+        try:
+            # 要求側（Discord のインタラクション等）がキャンセルされてもサイクルは続ける
+            return await asyncio.shield(self._cycle)
+        finally:
+            self.waiting -= 1
+
+    async def run_forever(self, interval: float, is_closed: Callable[[], bool]) -> None:
+        """interval 秒毎にサイクルを実行する"""
+        while not is_closed():
+            try:
+                await self.request_cycle("scheduled")
+            except Exception as e:
+                # 想定外のエラーでも定期実行は止めない
+                logging.exception(f"Unexpected error in watch cycle: {e}")
+            self.next_run_at = self.clock() + interval
+            await self.sleep(interval)
+
+    async def _run_cycle(self, result: CycleResult) -> CycleResult:
+        t0 = time.perf_counter()
+        try:
+            if await self._check_public(result) and (
+                self.plusmember_id and self.plusmember_password
+            ):
+                await self._check_talk(result)
+        finally:
+            result.seconds = time.perf_counter() - t0
+            self.last_result = result
+            self.stats.cycles += 1
+            if result.trigger == "manual":
+                self.stats.manual_cycles += 1
+            if result.errors:
+                self.stats.failed_cycles += 1
+        return result
+
+    async def _report_error(self, result: CycleResult, message: str) -> None:
+        result.errors.append(message)
+        try:
+            await self.dev_channel.send(message)
+        except Exception as e:
+            # 開発用チャンネルにも送れない場合はログだけ残してサイクルを続ける
+            logging.error(f"Failed to send error report to dev channel: {e}\n{message}")
+
+    async def _check_public(self, result: CycleResult) -> bool:
+        """公開ページの監視。取得に失敗した場合は False を返す"""
+        t0 = time.perf_counter()
+        try:
+            # requests / bs4 はブロッキングなので、Discord のイベントループを止めない
+            observation = await asyncio.to_thread(self.check_public, index=self.index)
+        except requests.exceptions.RequestException as e:
+            await self._report_error(result, f"HTMLの取得に失敗しました: {e}")
+            return False
+        except Exception as e:
+            await self._report_error(result, f"公開ページの監視中にエラーが発生しました: {e}")
+            return False
+        finally:
+            result.public_seconds = time.perf_counter() - t0
+
+        changes = observation.changes
+        if changes and changes != [INITIAL_SCAN]:
+            result.changes = changes
+            if not await self._notify_public(result, changes):
+                # 送信に失敗した新着は保存せず、次のサイクルで再び通知する
+                return True
+
+        # 通知を送り終えてから既出として保存する
+        try:
+            await asyncio.to_thread(self.commit_public, observation, index=self.index)
+        except Exception as e:
+            await self._report_error(result, f"スナップショットの保存に失敗しました: {e}")
+        return True
+
+    async def _notify_public(self, result: CycleResult, changes: list[str]) -> bool:
+        """通知を送る。Discord への送信に失敗した場合は False を返す"""
+        change_descriptions = "\n".join(f"• {c}" for c in changes)
+        msg = (
+            "@everyone\n"
+            f"ひよラボが更新されました！\n"
+            f"以下のセクションに変更がありました:\n{change_descriptions}\n"
+            f"{URL}\n"
+        )
+        try:
+            await self.channel.send(msg)
+        except Exception as e:
+            await self._report_error(result, f"Discord への通知に失敗しました: {e}")
+            return False
+        self.stats.notifications += 1
+
+        # https://hamagishihiyori.fanpla.jp/?t=202505030444 のように timestamp を含む URL を使用する
+        # 理由:
+        #   こうすることで同じ内容のツイートではないと判定されて POST に失敗することがなくなる。
+        #   また、t=xxx を含めても遷移先は https://hamagishihiyori.fanpla.jp/ にリダイレクトされる。
+        #   その結果、ツイートのプレビューは https://hamagishihiyori.fanpla.jp/ のものになり、きれいに表示される。
+        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+        x_link = urljoin(URL, f"?t={timestamp}")
+        x_msg = (
+            "／\n"
+            "📢 ひよラボが更新されました！\n"
+            "＼\n"
+            "以下のセクションが更新されました:\n"
+            f"{change_descriptions}\n\n"
+            "#HiyoLab\n"
+            "#ひよラボ\n"
+            "#濱岸ひより\n"
+            f"{x_link}"
+        )
+        try:
+            await asyncio.to_thread(self.x_client.create_tweet, text=x_msg)
+        except Exception as e:
+            # 処理に失敗してもループを継続させる
+            await self._report_error(
+                result, f"X に投稿に失敗しました: {e}\n投稿したかった文面:\n{x_msg}"
+            )
+
+        line_message = (
+            "ひよラボが更新されました！\n"
+            "以下のセクションに変更がありました:\n"
+            f"{change_descriptions}\n"
+            f"{URL}"
+        )
+        try:
+            await asyncio.to_thread(self.broadcast_line, line_message)
+        except Exception as e:
+            await self._report_error(
+                result,
+                f"LINE に投稿に失敗しました: {e}\n投稿したかった文面:\n{line_message}",
+            )
+        return True
+
+    async def _check_talk(self, result: CycleResult) -> None:
+        """トークページの監視（認証情報がある場合のみ呼ばれる）"""
+        t0 = time.perf_counter()
+        try:
+            observation = await self.check_talk(
+                self.plusmember_id, self.plusmember_password, index=self.talk_index
+            )
+        except Exception as e:
+            await self._report_error(result, f"トークページの監視中にエラーが発生しました: {e}")
+            return
+        finally:
+            result.talk_seconds = time.perf_counter() - t0
+
+        talk_changes = observation.changes
+        if talk_changes and talk_changes != [TALK_INITIAL_SCAN]:
+            result.talk_changes = talk_changes
+            if not await self._notify_talk(result):
+                return
+
+        try:
+            await asyncio.to_thread(self.commit_talk, observation, index=self.talk_index)
+        except Exception as e:
+            await self._report_error(result, f"トークスナップショットの保存に失敗しました: {e}")
+
+    async def _notify_talk(self, result: CycleResult) -> bool:
+        """通知を送る。Discord への送信に失敗した場合は False を返す"""
+        talk_msg = (
+            "@everyone\n"
+            "ひよりとーくが更新されました！\n"
+            f"{TALK_URL}\n"
+        )
+        try:
+            await self.channel.send(talk_msg)
+        except Exception as e:
+            await self._report_error(result, f"Discord へのトーク更新の通知に失敗しました: {e}")
+            return False
+        self.stats.notifications += 1
+
+        # Twitterにも投稿
+        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+        x_talk_link = f"{TALK_URL}&t={timestamp}"
+        x_talk_msg = (
+            "／\n"
+            "💬 ひよりとーくが更新されました！\n"
+            "＼\n\n"
+            "#ひよりとーく\n"
+            "#ひよラボ\n"
+            "#HiyoLab\n"
+            "#濱岸ひより\n"
+            f"{x_talk_link}"
+        )
+        try:
+            await asyncio.to_thread(self.x_client.create_tweet, text=x_talk_msg)
+        except Exception as e:
+            await self._report_error(
+                result,
+                f"X にトーク更新の投稿に失敗しました: {e}\n投稿したかった文面:\n{x_talk_msg}",
+            )
+
+        line_talk_message = (
+            "ひよりとーくが更新されました！\n"
+            f"{TALK_URL}"
+        )
+        try:
+            await asyncio.to_thread(self.broadcast_line, line_talk_message)
+        except Exception as e:
+            await self._report_error(
+                result,
+                f"LINE にトーク更新の投稿に失敗しました: {e}\n投稿したかった文面:\n{line_talk_message}",
+            )
+        return True
+
+    # ---------- /check, /status, /stats 用の表示 -----------------------------
+
+    def describe_result(self, result: CycleResult) -> str:
+        lines = [f"サイクル完了（{result.trigger}, {result.seconds:.2f}s）"]
+        lines.append(f"公開ページ: {', '.join(result.changes) or '変更なし'}")
+        if self.plusmember_id and self.plusmember_password:
+            lines.append(f"トーク: {', '.join(result.talk_changes) or '変更なし'}")
+        if result.errors:
+            lines.append(f"エラー: {len(result.errors)}件（開発用チャンネルを参照）")
+        return "\n".join(lines)
+
+    def describe_status(self) -> str:
+        now = self.clock()
+        lines = []
+        running = self.running
+        if running is not None:
+            lines.append(
+                f"実行中: {running.trigger}（{now - running.started_at:.1f}s 経過、"
+                f"待機中の要求 {self.waiting}件）"
+            )
+        else:
+            lines.append("待機中")
+
+        last = self.last_result
+        if last is None:
+            lines.append("前回のサイクル: なし")
+        else:
+            lines.append(
+                f"前回のサイクル: {now - last.started_at:.0f}s 前（{last.trigger}）"
+                f" 合計 {last.seconds:.2f}s"
+                f" / 公開ページ {_format_seconds(last.public_seconds)}"
+                f" / トーク {_format_seconds(last.talk_seconds)}"
+                f" / エラー {len(last.errors)}件"
+            )
+        if self.next_run_at is not None:
+            lines.append(f"次の定期実行: {max(0.0, self.next_run_at - now):.0f}s 後")
+        return "\n".join(lines)
+
+    def describe_stats(self) -> str:
+        stats = self.stats
+        return "\n".join(
+            [
+                f"サイクル: {stats.cycles}回（うち手動 {stats.manual_cycles}回）",
+                f"実行中のサイクルに合流した要求: {stats.shared_requests}件",
+                f"エラーのあったサイクル: {stats.failed_cycles}回",
+                f"送信した通知: {stats.notifications}件",
+                f"待機中の要求: {self.waiting}件",
+                f"既出ID: 公開ページ {len(self.index)}件 ({self.index.nbytes}B)"
+                f" / トーク {len(self.talk_index)}件 ({self.talk_index.nbytes}B)",
+            ]
+        )
+
+
+def _format_seconds(seconds: float | None) -> str:
+    return "-" if seconds is None else f"{seconds:.2f}s"
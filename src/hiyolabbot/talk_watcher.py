@@ -4,10 +4,15 @@ import os
 import pathlib
 import re
 import tempfile
+import time
+from collections.abc import Awaitable, Callable
 from typing import Optional
 
 from playwright.async_api import async_playwright, Browser, Page
 
+from hiyolabbot import archive
+from hiyolabbot.item_index import ItemIndex
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 # ---------- site-specific settings -----------------------------------------
@@ -16,6 +21,8 @@ LOGIN_URL = "https://hamagishihiyori.fanpla.jp/1/login/"
 
 TALK_SNAPSHOT_FILE = pathlib.Path("talk_snapshot.json")
 SESSION_FILE = pathlib.Path("playwright_session.json")
+
+TALK_INITIAL_SCAN = "トーク初回スキャン（スナップショット作成）"
 # ---------------------------------------------------------------------------
 
 
@@ -140,66 +147,131 @@ def make_talk_snapshot(comment_ids: list[str]) -> dict[str, list[str]]:
     }
 
 
-def load_talk_previous() -> Optional[dict[str, list[str]]]:
+def load_talk_previous(path: Optional[pathlib.Path] = None) -> Optional[dict[str, list[str]]]:
     """以前のトークスナップショットを読み込む"""
-    if TALK_SNAPSHOT_FILE.exists():
-        return json.loads(TALK_SNAPSHOT_FILE.read_text(encoding="utf-8"))
+    path = path or TALK_SNAPSHOT_FILE
+    if path.exists():
+        try:
+            text = path.read_text(encoding="utf-8")
+            if not text.strip():
+                logging.warning("talk_snapshot.json is empty, treating as first scan")
+                return None
+            return json.loads(text)
+        except json.JSONDecodeError:
+            logging.warning("talk_snapshot.json is corrupted, treating as first scan")
+            return None
     return None
 
 
-def save_talk_snapshot(snap: dict[str, list[str]]) -> None:
+def save_talk_snapshot(snap: dict[str, list[str]], path: Optional[pathlib.Path] = None) -> None:
     """トークスナップショットを保存"""
     logging.info("Saving talk snapshot")
+    path = path or TALK_SNAPSHOT_FILE
     data = json.dumps(snap, ensure_ascii=False, indent=2)
     tmp_fd, tmp_path = tempfile.mkstemp(
-        dir=TALK_SNAPSHOT_FILE.parent, suffix=".tmp"
+        dir=path.parent, suffix=".tmp"
     )
     try:
         with os.fdopen(tmp_fd, "w", encoding="utf-8") as f:
             f.write(data)
-        pathlib.Path(tmp_path).replace(TALK_SNAPSHOT_FILE)
+        pathlib.Path(tmp_path).replace(path)
     except BaseException:
         pathlib.Path(tmp_path).unlink(missing_ok=True)
         raise
 
 
+def _index_talk_snapshot(prev: Optional[dict[str, list[str]]]) -> ItemIndex:
+    """トークスナップショットのインデックスを作る。作れない場合は空（初回扱い）にする"""
+    try:
+        return ItemIndex.from_snapshot(prev, numeric=True)
+    except (ValueError, TypeError, AttributeError) as e:
+        logging.warning(f"talk_snapshot.json cannot be indexed ({e}), treating as first scan")
+        return ItemIndex(numeric=True)
+
+
+def load_talk_index(path: Optional[pathlib.Path] = None) -> ItemIndex:
+    """保存済みトークスナップショットから既出コメント ID のインデックスを作る"""
+    return _index_talk_snapshot(load_talk_previous(path))
+
+
+def _describe_talk_changes(new_ids: dict[str, list[str]]) -> list[str]:
+    new_count = len(new_ids.get("talk_comments", []))
+    if new_count:
+        return [f"新しいトーク: {new_count}件のメッセージ"]
+    return []
+
+
 def diff_talk(prev: Optional[dict[str, list[str]]], curr: dict[str, list[str]]) -> list[str]:
     """トークの差分を検出"""
     logging.info("Calculating talk differences")
     
-    if prev is None:
-        return ["トーク初回スキャン（スナップショット作成）"]
-    
-    prev_ids = set(prev.get("talk_comments", []))
-    curr_ids = set(curr.get("talk_comments", []))
+    index = _index_talk_snapshot(prev)
+    if not index.initialized:
+        return [TALK_INITIAL_SCAN]
     
-    new_comment_ids = curr_ids - prev_ids
-    
-    if new_comment_ids:
-        new_count = len(new_comment_ids)
-        return [f"新しいトーク: {new_count}件のメッセージ"]
-    
-    return []
+    return _describe_talk_changes(index.new_items(curr))
+
 
+async def check_talk_updates(
+    plusmember_id: str,
+    password: str,
+    index: Optional[ItemIndex] = None,
+    *,
+    extract: Optional[Callable[[str, str], Awaitable[list[str]]]] = None,
+    snapshot_file: Optional[pathlib.Path] = None,
+    clock: Callable[[], float] = time.time,
+) -> archive.Observation:
+    """トークページを取得して前回からの新着を検出する（保存はしない）
 
-async def check_talk_updates(plusmember_id: str, password: str) -> list[str]:
-    """トークページの更新をチェックして変更があった場合の説明を返す"""
+    index を渡すとスナップショットファイルを読み直さずにそのインデックスと比較する。
+    変更の説明は返り値の changes に入る。通知を送り終えたら commit_talk_updates で
+    保存すること。コメント ID の取得処理・保存先・時計はテスト用に差し替えられる。
+    """
     try:
-        comment_ids = await extract_comment_ids(plusmember_id, password)
+        started_at = clock()
+        t0 = time.perf_counter()
+        comment_ids = await (extract or extract_comment_ids)(plusmember_id, password)
+        fetch_seconds = time.perf_counter() - t0
         curr = make_talk_snapshot(comment_ids)
-        prev = load_talk_previous()
-        changes = diff_talk(prev, curr)
-        save_talk_snapshot(curr)
-        return changes
+        if index is None:
+            index = load_talk_index(snapshot_file)
+
+        logging.info("Calculating talk differences")
+        new_ids = index.new_items(curr) if index.initialized else None
+        return archive.Observation(
+            target="talk",
+            started_at=started_at,
+            fetch_seconds=fetch_seconds,
+            curr=curr,
+            new_ids=new_ids,
+            changes=(
+                _describe_talk_changes(new_ids) if new_ids is not None else [TALK_INITIAL_SCAN]
+            ),
+        )
     except Exception as e:
         logging.error(f"Failed to check talk updates: {e}")
         raise
-    
-if __name__ == "__main__":
-    import asyncio
-    import os
-    
-    from dotenv import load_dotenv
-    load_dotenv()
-    
-    asyncio.run(check_talk_updates(os.environ["PLUSMEMBER_ID"], os.environ["PLUSMEMBER_PASSWORD"]))
\ No newline at end of file
+
+
+def commit_talk_updates(
+    observation: archive.Observation,
+    index: Optional[ItemIndex] = None,
+    *,
+    snapshot_file: Optional[pathlib.Path] = None,
+    archive_dir: Optional[pathlib.Path] = None,
+) -> None:
+    """check_talk_updates の観測結果をスナップショットに保存し、アーカイブに記録する"""
+    save_talk_snapshot(observation.curr, snapshot_file)
+    if index is not None:
+        index.update(observation.curr)
+    try:
+        archive.record_observation(
+            observation.target,
+            observation.started_at,
+            observation.fetch_seconds,
+            observation.curr,
+            observation.new_ids,
+            directory=archive_dir,
+        )
+    except OSError as e:
+        logging.warning(f"Failed to archive talk observation: {e}")
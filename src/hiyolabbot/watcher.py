@@ -1,13 +1,20 @@
+import dataclasses
 import json
 import logging
 import os
 import pathlib
 import re
 import tempfile
+import time
+from collections.abc import Callable
 
 import bs4  # beautifulsoup4
+import lxml.etree
 import requests
 
+from hiyolabbot import archive
+from hiyolabbot.item_index import ItemIndex
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 # ---------- site‑specific settings -----------------------------------------
@@ -23,19 +30,119 @@ TRACK_SELECTORS = {
 
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    # gzip/deflate に加え、brotli がインストールされていれば br も要求する
+    "Accept-Encoding": requests.utils.DEFAULT_ACCEPT_ENCODING,
 }
 TIMEOUT = 30  # seconds
+CHUNK_SIZE = 16 * 1024  # bytes
+MAX_BODY_BYTES = 5 * 1024 * 1024  # 展開後の本文がこれを超えたら取得を中止する
 
 SNAPSHOT_FILE = pathlib.Path("snapshot.json")
+
+INITIAL_SCAN = "初回スキャン（スナップショット作成）"
 # ---------------------------------------------------------------------------
 
 
+class ResponseTooLarge(requests.exceptions.RequestException):
+    """レスポンス本文が MAX_BODY_BYTES を超えた"""
+
+
+@dataclasses.dataclass
+class FetchStats:
+    """1 回の取得にかかったバイト数と時間"""
+
+    url: str
+    status: int
+    content_encoding: str
+    wire_bytes: int  # 圧縮されたまま受信したバイト数
+    body_bytes: int  # 展開後に読み込んだバイト数
+    seconds: float
+    stopped_early: bool  # 全セクションを読み終えた時点で打ち切ったか
+
+
+def _tracked_section_ids() -> set[str] | None:
+    """TRACK_SELECTORS が全て "section#id" 形式ならその id の集合を返す"""
+    ids: set[str] = set()
+    for selector in TRACK_SELECTORS:
+        match = re.fullmatch(r"section#([\w-]+)", selector.strip())
+        if match is None:
+            return None
+        ids.add(match.group(1))
+    return ids
+
+
+def fetch_page(url: str = URL, stop_early: bool = True) -> tuple[bs4.BeautifulSoup, FetchStats]:
+    """Download the page in chunks and return parsed soup with fetch stats.
+
+    本文はストリーミングで読み込み、stop_early=True の場合は TRACK_SELECTORS の
+    全セクションの終了タグを読んだ時点で残りのダウンロードを打ち切る。
+    """
+    logging.info("Fetching HTML from URL")
+    started = time.perf_counter()
+    remaining = _tracked_section_ids() if stop_early else None
+    tracker = (
+        lxml.etree.HTMLPullParser(events=("end",), tag="section") if remaining else None
+    )
+
+    resp = requests.get(url, headers=HEADERS, timeout=TIMEOUT, stream=True)
+    with resp:
+        resp.raise_for_status()
+        length = resp.headers.get("Content-Length")
+        if length and length.isdigit() and int(length) > MAX_BODY_BYTES:
+            raise ResponseTooLarge(f"Content-Length {length} exceeds {MAX_BODY_BYTES} bytes")
+
+        chunks: list[bytes] = []
+        body_bytes = 0
+        stopped_early = False
+        for chunk in resp.iter_content(chunk_size=CHUNK_SIZE):
+            body_bytes += len(chunk)
+            if body_bytes > MAX_BODY_BYTES:
+                raise ResponseTooLarge(f"Response body exceeds {MAX_BODY_BYTES} bytes")
+            chunks.append(chunk)
+            if tracker is not None:
+                tracker.feed(chunk)
+                for _, element in tracker.read_events():
+                    remaining.discard(element.get("id"))
+                if not remaining:
+                    stopped_early = True
+                    break
+
+        stats = FetchStats(
+            url=url,
+            status=resp.status_code,
+            content_encoding=resp.headers.get("Content-Encoding", "identity"),
+            wire_bytes=resp.raw.tell(),
+            body_bytes=body_bytes,
+            seconds=time.perf_counter() - started,
+            stopped_early=stopped_early,
+        )
+        # charset がヘッダーで明示されていなければ <meta> から判定させる
+        encoding = resp.encoding if "charset" in resp.headers.get("Content-Type", "") else None
+
+    logging.info(
+        "Fetched %s: status=%s encoding=%s wire=%sB body=%sB %.0fms%s",
+        url,
+        stats.status,
+        stats.content_encoding,
+        stats.wire_bytes,
+        stats.body_bytes,
+        stats.seconds * 1000,
+        " (stopped early)" if stats.stopped_early else "",
+    )
+    return parse_html(b"".join(chunks), encoding), stats
+
+
 def fetch_html() -> bs4.BeautifulSoup:
     """Download the page and return parsed soup."""
-    logging.info("Fetching HTML from URL")
-    resp = requests.get(URL, headers=HEADERS, timeout=TIMEOUT)
-    resp.raise_for_status()
-    return bs4.BeautifulSoup(resp.text, "lxml")
+    soup, _ = fetch_page()
+    return soup
+
+
+def parse_html(html: str | bytes, encoding: str | None = None) -> bs4.BeautifulSoup:
+    """Parse an HTML document (downloaded or recorded) into soup."""
+    if isinstance(html, bytes) and encoding:
+        return bs4.BeautifulSoup(html, "lxml", from_encoding=encoding)
+    return bs4.BeautifulSoup(html, "lxml")
 
 
 def extract_item_ids(section: bs4.Tag | None) -> list[str]:
@@ -75,10 +182,11 @@ def make_snapshot(soup: bs4.BeautifulSoup) -> dict[str, list[str]]:
     return snap
 
 
-def load_previous() -> dict[str, list[str]] | None:
-    if SNAPSHOT_FILE.exists():
+def load_previous(path: pathlib.Path | None = None) -> dict[str, list[str]] | None:
+    path = path or SNAPSHOT_FILE
+    if path.exists():
         try:
-            text = SNAPSHOT_FILE.read_text(encoding="utf-8")
+            text = path.read_text(encoding="utf-8")
             if not text.strip():
                 logging.warning("snapshot.json is empty, treating as first scan")
                 return None
@@ -89,48 +197,115 @@ def load_previous() -> dict[str, list[str]] | None:
     return None
 
 
-def save_snapshot(snap: dict[str, list[str]]) -> None:
+def save_snapshot(snap: dict[str, list[str]], path: pathlib.Path | None = None) -> None:
     logging.info("Saving snapshot")
+    path = path or SNAPSHOT_FILE
     data = json.dumps(snap, ensure_ascii=False, indent=2)
     tmp_fd, tmp_path = tempfile.mkstemp(
-        dir=SNAPSHOT_FILE.parent, suffix=".tmp"
+        dir=path.parent, suffix=".tmp"
     )
     try:
         with os.fdopen(tmp_fd, "w", encoding="utf-8") as f:
             f.write(data)
-        pathlib.Path(tmp_path).replace(SNAPSHOT_FILE)
+        pathlib.Path(tmp_path).replace(path)
     except BaseException:
         pathlib.Path(tmp_path).unlink(missing_ok=True)
         raise
 
 
+def _is_legacy(snap: dict) -> bool:
+    # 以前の形式（ハッシュ文字列）で保存されている場合は、初回とみなす
+    return any(not isinstance(v, list) for v in snap.values())
+
+
+def _index_snapshot(prev: dict[str, list[str]] | None) -> ItemIndex:
+    """スナップショットのインデックスを作る。作れない場合は空（初回扱い）にする"""
+    try:
+        if prev is None or _is_legacy(prev):
+            return ItemIndex()
+        return ItemIndex.from_snapshot(prev)
+    except (ValueError, TypeError, AttributeError) as e:
+        # 末尾が数字でない ID を含む古い形式・手で編集された場合も初回とみなす
+        logging.warning("snapshot.json cannot be indexed (%s), treating as first scan", e)
+        return ItemIndex()
+
+
+def load_index(path: pathlib.Path | None = None) -> ItemIndex:
+    """保存済みスナップショットから既出 ID のインデックスを作る"""
+    return _index_snapshot(load_previous(path))
+
+
 def diff(prev: dict[str, list[str]] | None, curr: dict[str, list[str]]) -> list[str]:
     """Return list of labels where *new* items appeared since last snapshot."""
     logging.info("Calculating differences")
 
-    # 以前の形式（ハッシュ文字列）で保存されている場合は、初回とみなす
-    if prev is None or any(not isinstance(v, list) for v in prev.values()):
-        return ["初回スキャン（スナップショット作成）"]
-
-    changes: list[str] = []
-    for label, curr_ids in curr.items():
-        prev_ids = prev.get(label, [])
-        # 以前存在しなかった ID があるか？
-        new_items = set(curr_ids) - set(prev_ids)
-        if new_items:
-            changes.append(label)
-    return changes
-
-
-if __name__ == "__main__":
-    logging.info("Starting watcher")
-   
-    logging.info("Fetching HTML")
-    soup = fetch_html()
-    logging.info("Making snapshot")
-    snapshot = make_snapshot(soup)
-    logging.info("Diffing")
-    changes = diff(load_previous(), snapshot)
-    logging.info("Saving snapshot")
-    save_snapshot(snapshot)
-    logging.info("Changes: %s", changes)
+    index = _index_snapshot(prev)
+    if not index.initialized:
+        return [INITIAL_SCAN]
+
+    # ID（href）は文字列のまま比較する
+    return list(index.new_items(curr))
+
+
+def check_updates(
+    index: ItemIndex | None = None,
+    *,
+    fetch: Callable[[], tuple[bs4.BeautifulSoup, FetchStats]] | None = None,
+    snapshot_file: pathlib.Path | None = None,
+    clock: Callable[[], float] = time.time,
+) -> archive.Observation:
+    """公開ページを取得して前回からの新着を検出する（保存はしない）
+
+    index を渡すとスナップショットファイルを読み直さずにそのインデックスと比較する。
+    変更があったセクションのラベルは返り値の changes に入る。通知を送り終えたら
+    commit_updates で保存すること。取得処理・保存先・時計はテスト用に差し替えられる。
+    """
+    started_at = clock()
+    t0 = time.perf_counter()
+    soup, stats = (fetch or fetch_page)()
+    curr = make_snapshot(soup)
+    fetch_seconds = time.perf_counter() - t0
+    if index is None:
+        index = load_index(snapshot_file)
+
+    logging.info("Calculating differences")
+    new_ids = index.new_items(curr) if index.initialized else None
+    return archive.Observation(
+        target="public",
+        started_at=started_at,
+        fetch_seconds=fetch_seconds,
+        curr=curr,
+        new_ids=new_ids,
+        changes=list(new_ids) if new_ids is not None else [INITIAL_SCAN],
+        wire_bytes=stats.wire_bytes,
+        body_bytes=stats.body_bytes,
+    )
+
+
+def commit_updates(
+    observation: archive.Observation,
+    index: ItemIndex | None = None,
+    *,
+    snapshot_file: pathlib.Path | None = None,
+    archive_dir: pathlib.Path | None = None,
+) -> None:
+    """check_updates の観測結果をスナップショットに保存し、アーカイブに記録する
+
+    index を渡すと今回の内容に更新する。
+    """
+    save_snapshot(observation.curr, snapshot_file)
+    if index is not None:
+        index.update(observation.curr)
+    try:
+        archive.record_observation(
+            observation.target,
+            observation.started_at,
+            observation.fetch_seconds,
+            observation.curr,
+            observation.new_ids,
+            wire_bytes=observation.wire_bytes,
+            body_bytes=observation.body_bytes,
+            directory=archive_dir,
+        )
+    except OSError as e:
+        logging.warning("Failed to archive observation: %s", e)
@@ -0,0 +1,55 @@
+"""ローカルサーバーを相手に fetch_page の転送量とレイテンシを計測する
+
+    PYTHONPATH=src python tests/bench_fetch.py [-n 50]
+"""
+import argparse
+import logging
+import statistics
+import time
+
+from fanclub_server import FanclubServer, make_homepage
+
+from hiyolabbot import watcher
+
+# (name, compress, stop_early)
+MODES = [
+    ("identity / full read", False, False),
+    ("identity / stop early", False, True),
+    ("gzip / full read", True, False),
+    ("gzip / stop early", True, True),
+]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--iterations", type=int, default=50)
+    parser.add_argument("--footer-bytes", type=int, default=250_000)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    page = make_homepage(footer_bytes=args.footer_bytes)
+    print(f"page size: {len(page)} bytes, {args.iterations} fetches per mode")
+    # fetch: 受信完了まで（FetchStats.seconds）、total: soup の構築まで含めた時間
+    print(
+        f"{'mode':<24}{'wire B':>10}{'body B':>10}"
+        f"{'fetch p50':>11}{'total p50':>11}{'total max':>11}  (ms)"
+    )
+    for name, compress, stop_early in MODES:
+        runs = []
+        totals = []
+        with FanclubServer(page, compress=compress) as server:
+            for _ in range(args.iterations):
+                started = time.perf_counter()
+                _, stats = watcher.fetch_page(server.url, stop_early=stop_early)
+                totals.append((time.perf_counter() - started) * 1000)
+                runs.append(stats)
+        fetches = [r.seconds * 1000 for r in runs]
+        print(
+            f"{name:<24}{runs[-1].wire_bytes:>10}{runs[-1].body_bytes:>10}"
+            f"{statistics.median(fetches):>11.1f}"
+            f"{statistics.median(totals):>11.1f}{max(totals):>11.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""ItemIndex の差分検出と、以前の set による差分検出の所要時間を比較する
+
+    PYTHONPATH=src python tests/bench_index.py [--talk-ids 100000]
+
+baseline は以前の監視ループと同じく、サイクル毎にスナップショット JSON を
+読み込んでラベル毎に set(curr) - set(prev) を計算する（"set only" は読み込みを除いた
+差分だけ）。index は保持しているインデックスとの差分（new_items）と、通知後の
+インデックス更新（update）までを計測する。
+"""
+import argparse
+import json
+import timeit
+
+from hiyolabbot.item_index import ItemIndex
+
+LABELS = ("INFORMATION", "BLOG", "MOVIE", "PHOTO")
+
+
+def public_snapshots(items_per_section: int = 12) -> tuple[dict, dict]:
+    prev = {
+        label: [f"/{label.lower()}/detail/{100000 + i * 100 + j}" for j in range(items_per_section)]
+        for i, label in enumerate(LABELS)
+    }
+    # 各セクションに 1 件ずつ新着が増え、最も古い 1 件が押し出される
+    curr = {
+        label: [f"/{label.lower()}/detail/{100000 + i * 100 + j}" for j in range(1, items_per_section + 1)]
+        for i, label in enumerate(LABELS)
+    }
+    return prev, curr
+
+
+def talk_snapshots(count: int) -> tuple[dict, dict]:
+    prev = {"talk_comments": [str(5_000_000 + i) for i in range(count)]}
+    curr = {"talk_comments": [str(5_000_000 + i) for i in range(1, count + 1)]}
+    return prev, curr
+
+
+def index_cycle(prev: dict, curr: dict, numeric: bool):
+    """prev と curr を交互に観測したサイクルの new_items + update を 1 回ずつ進める"""
+    index = ItemIndex.from_snapshot(prev, numeric=numeric)
+    while True:
+        for snap in (curr, prev):
+            index.new_items(snap)
+            index.update(snap)
+            yield
+
+
+def measure(prev: dict, curr: dict, numeric: bool, number: int) -> dict[str, float]:
+    """各方法の 1 回あたりの秒数を返す（3 回計測した最小値）"""
+    text = json.dumps(prev)
+
+    def baseline():
+        loaded = json.loads(text)
+        return {label: set(ids) - set(loaded.get(label, [])) for label, ids in curr.items()}
+
+    def set_only():
+        return {label: set(ids) - set(prev.get(label, [])) for label, ids in curr.items()}
+
+    index = ItemIndex.from_snapshot(prev, numeric=numeric)
+
+    def detect():
+        # 同じリストを渡すと変換結果が使い回されるので、毎回新しいリストにする
+        return index.new_items({label: list(ids) for label, ids in curr.items()})
+
+    cycle = index_cycle(prev, curr, numeric)
+
+    def detect_and_update():
+        next(cycle)
+
+    # 新着の検出結果が一致すること
+    assert {label: set(ids) for label, ids in detect().items()} == {
+        label: ids for label, ids in set_only().items() if ids
+    }
+    funcs = {
+        "baseline (load + set)": baseline,
+        "baseline (set only)": set_only,
+        "index new_items": detect,
+        "index new_items + update": detect_and_update,
+    }
+    return {
+        name: min(timeit.repeat(func, number=number, repeat=3)) / number
+        for name, func in funcs.items()
+    }
+
+
+def bench(name: str, prev: dict, curr: dict, numeric: bool, number: int) -> None:
+    print(f"{name}: {number} calls")
+    for label, seconds in measure(prev, curr, numeric, number).items():
+        print(f"  {label:<28}{seconds * 1e6:>12.1f} us/call")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--talk-ids", type=int, default=100_000)
+    args = parser.parse_args()
+
+    bench("public page (4 x 12 hrefs)", *public_snapshots(), numeric=False, number=20_000)
+    bench(f"talk ({args.talk_ids} comment IDs)", *talk_snapshots(args.talk_ids), numeric=True, number=10)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""監視ループ全体をプロセス内で動かすための偽物
+
+Discord チャンネル・X・LINE・時計・ファンクラブ（公開ページとトーク）を
+置き換え、保存先を一時ディレクトリにした Monitor を WatchHarness で組み立てる。
+通知はすべて共有の events に (送信先, 本文) の順で記録される。
+"""
+import asyncio
+import contextlib
+import functools
+import logging
+import pathlib
+
+from fanclub_server import SECTIONS, make_homepage
+
+from hiyolabbot import talk_watcher, watcher
+from hiyolabbot.monitor import Monitor
+
+
+class FakeChannel:
+    """discord.TextChannel の send だけを持つ偽物。error を設定すると失敗する"""
+
+    def __init__(self, name: str, events: list[tuple[str, str]]):
+        self.name = name
+        self.events = events
+        self.messages: list[str] = []
+        self.error: Exception | None = None
+
+    async def send(self, content: str) -> None:
+        if self.error is not None:
+            raise self.error
+        self.messages.append(content)
+        self.events.append((self.name, content))
+
+
+class FakeXClient:
+    """tweepy.Client の create_tweet だけを持つ偽物。error を設定すると失敗する"""
+
+    def __init__(self, events: list[tuple[str, str]]):
+        self.events = events
+        self.tweets: list[str] = []
+        self.error: Exception | None = None
+
+    def create_tweet(self, text: str) -> None:
+        if self.error is not None:
+            raise self.error
+        self.tweets.append(text)
+        self.events.append(("x", text))
+
+
+class FakeLine:
+    """LINE のブロードキャスト関数の偽物。error を設定すると失敗する"""
+
+    def __init__(self, events: list[tuple[str, str]]):
+        self.events = events
+        self.messages: list[str] = []
+        self.error: Exception | None = None
+
+    def __call__(self, message: str) -> None:
+        if self.error is not None:
+            raise self.error
+        self.messages.append(message)
+        self.events.append(("line", message))
+
+
+class _FakeInteractionResponse:
+    def __init__(self, sent: list[tuple[str, str | None, bool]]):
+        self.sent = sent
+
+    async def send_message(self, content: str, ephemeral: bool = False) -> None:
+        self.sent.append(("response", content, ephemeral))
+
+    async def defer(self, ephemeral: bool = False, thinking: bool = False) -> None:
+        self.sent.append(("defer", None, ephemeral))
+
+
+class _FakeFollowup:
+    def __init__(self, sent: list[tuple[str, str | None, bool]]):
+        self.sent = sent
+
+    async def send(self, content: str, ephemeral: bool = False) -> None:
+        self.sent.append(("followup", content, ephemeral))
+
+
+class FakeInteraction:
+    """discord.Interaction の response / followup だけを持つ偽物
+
+    送信した内容は sent に (種類, 本文, ephemeral) の順で記録される。
+    """
+
+    def __init__(self):
+        self.sent: list[tuple[str, str | None, bool]] = []
+        self.response = _FakeInteractionResponse(self.sent)
+        self.followup = _FakeFollowup(self.sent)
+
+
+class FakeClock:
+    """time.time / asyncio.sleep の代わり。sleep は待たずに時刻だけ進める"""
+
+    def __init__(self, now: float = 1_760_000_000.0):
+        self.now = now
+        self.on_sleep = None  # sleep の度に呼ばれるフック（新着の投入などに使う）
+
+    def time(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float) -> None:
+        self.now += seconds
+        if self.on_sleep is not None:
+            self.on_sleep()
+        await asyncio.sleep(0)
+
+
+class FakeFanclub:
+    """公開ページとトークの中身を持ち、任意のタイミングで新着を追加できる"""
+
+    def __init__(self, items_per_section: int = 5, footer_bytes: int = 0):
+        self.footer_bytes = footer_bytes
+        next_id = 100000
+        self.items: dict[str, list[int]] = {}
+        for section in SECTIONS:
+            self.items[section] = list(range(next_id + items_per_section - 1, next_id - 1, -1))
+            next_id += items_per_section
+        self._next_id = next_id
+        self.comments: list[str] = [str(i) for i in range(5000, 5005)]
+        self.fetches = 0
+        self.talk_fetches = 0
+        self.error: Exception | None = None  # 設定すると公開ページの取得が失敗する
+        self._page: tuple[bytes, object] | None = None
+
+    def publish(self, section: str) -> str:
+        """section に新しい項目を追加してその href を返す"""
+        item_id = self._next_id
+        self._next_id += 1
+        self.items[section].insert(0, item_id)
+        self._page = None
+        return f"/{section}/detail/{item_id}"
+
+    def post_comment(self) -> str:
+        comment_id = str(int(self.comments[-1]) + 1)
+        self.comments.append(comment_id)
+        return comment_id
+
+    def render(self) -> bytes:
+        return make_homepage(header_bytes=0, footer_bytes=self.footer_bytes, items=self.items)
+
+    def fetch(self) -> tuple:
+        """watcher.fetch_page の代わり。内容が変わるまで解析結果を使い回す"""
+        self.fetches += 1
+        if self.error is not None:
+            raise self.error
+        if self._page is None:
+            html = self.render()
+            self._page = (html, watcher.parse_html(html))
+        html, soup = self._page
+        stats = watcher.FetchStats(watcher.URL, 200, "identity", len(html), len(html), 0.0, False)
+        return soup, stats
+
+    async def extract(self, plusmember_id: str, password: str) -> list[str]:
+        """talk_watcher.extract_comment_ids の代わり"""
+        self.talk_fetches += 1
+        return list(self.comments)
+
+
+class WatchHarness:
+    """偽物と一時ディレクトリの保存先で組み立てた Monitor"""
+
+    def __init__(self, directory: pathlib.Path, talk: bool = False, fanclub: FakeFanclub | None = None, fetch=None):
+        self.directory = directory
+        self.events: list[tuple[str, str]] = []
+        self.channel = FakeChannel("channel", self.events)
+        self.dev_channel = FakeChannel("dev", self.events)
+        self.x_client = FakeXClient(self.events)
+        self.line = FakeLine(self.events)
+        self.clock = FakeClock()
+        self.fanclub = fanclub or FakeFanclub()
+
+        self.snapshot_file = directory / "snapshot.json"
+        self.talk_snapshot_file = directory / "talk_snapshot.json"
+        self.archive_dir = directory / "archive"
+        self.monitor = Monitor(
+            self.channel,
+            self.dev_channel,
+            self.x_client,
+            self.line,
+            "test_id" if talk else None,
+            "test_password" if talk else None,
+            check_public=functools.partial(
+                watcher.check_updates,
+                fetch=fetch or self.fanclub.fetch,
+                snapshot_file=self.snapshot_file,
+                clock=self.clock.time,
+            ),
+            check_talk=functools.partial(
+                talk_watcher.check_talk_updates,
+                extract=self.fanclub.extract,
+                snapshot_file=self.talk_snapshot_file,
+                clock=self.clock.time,
+            ),
+            commit_public=functools.partial(
+                watcher.commit_updates,
+                snapshot_file=self.snapshot_file,
+                archive_dir=self.archive_dir,
+            ),
+            commit_talk=functools.partial(
+                talk_watcher.commit_talk_updates,
+                snapshot_file=self.talk_snapshot_file,
+                archive_dir=self.archive_dir,
+            ),
+            index=watcher.load_index(self.snapshot_file),
+            talk_index=talk_watcher.load_talk_index(self.talk_snapshot_file),
+            clock=self.clock.time,
+            sleep=self.clock.sleep,
+        )
+
+    def notifications(self, sink: str = "channel") -> list[str]:
+        return [text for name, text in self.events if name == sink]
+
+    async def run(self, cycles: int, interval: float = 60, between=None) -> None:
+        """定期実行ループを cycles 回まわす。between はサイクルの間に呼ばれる"""
+        start = self.monitor.stats.cycles
+        self.clock.on_sleep = between
+        with quiet_logging():
+            await self.monitor.run_forever(
+                interval, lambda: self.monitor.stats.cycles - start >= cycles
+            )
+
+
+@contextlib.contextmanager
+def quiet_logging():
+    """サイクル毎の INFO ログを止める（大量のサイクルを回すときのため）"""
+    logging.disable(logging.INFO)
+    try:
+        yield
+    finally:
+        logging.disable(logging.NOTSET)
@@ -0,0 +1,125 @@
+"""テスト・ベンチマーク用のファンクラブページ代替ローカルサーバー"""
+import gzip
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SECTIONS = ("news", "blog", "movie", "photo")
+
+
+def make_homepage(
+    items_per_section: int = 12,
+    first_id: int = 100000,
+    header_bytes: int = 40_000,
+    footer_bytes: int = 250_000,
+    items: dict[str, list[int]] | None = None,
+) -> bytes:
+    """実際のトップページに近いサイズ・構造の HTML を生成する
+
+    監視対象セクションの前後にナビゲーションやスクリプト、フッターに相当する
+    ダミーのマークアップを置く。items を渡すと各セクションの項目 ID
+    （新しい順）をそのまま使う。
+    """
+    if items is None:
+        item_ids = iter(range(first_id, first_id + items_per_section * len(SECTIONS)))
+        items = {
+            section: [next(item_ids) for _ in range(items_per_section)]
+            for section in SECTIONS
+        }
+    rng = random.Random(0)
+
+    def filler(size: int, tag: str) -> str:
+        # 実ページ並みの圧縮率になるよう、行毎に少しずつ異なる内容にする
+        rows = [f'<ul class="{tag}">\n']
+        written = 0
+        while written < size:
+            token = "%016x" % rng.getrandbits(64)
+            row = (
+                f'<li class="{tag}-item" data-id="{token}"><a href="/{tag}/{token[:8]}/">'
+                f"{tag} {token[8:]}</a><span>テキスト {rng.randint(0, 9999)}</span></li>\n"
+            )
+            rows.append(row)
+            written += len(row.encode())
+        rows.append("</ul>\n")
+        return "".join(rows)
+
+    parts = [
+        '<!DOCTYPE html>\n<html lang="ja"><head><meta charset="utf-8">'
+        "<title>濱岸ひより オフィシャルファンクラブ</title></head><body>\n",
+        filler(header_bytes, "nav"),
+    ]
+    for section in SECTIONS:
+        parts.append(f'<section id="{section}"><ul>\n')
+        for item_id in items.get(section, []):
+            parts.append(
+                f'<li><a href="/{section}/detail/{item_id}/?page=1">'
+                f"<time>2026.10.19</time><p>{section} {item_id}</p></a></li>\n"
+            )
+        parts.append("</ul></section>\n")
+    parts.append(filler(footer_bytes, "footer"))
+    parts.append("</body></html>\n")
+    return "".join(parts).encode("utf-8")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server: FanclubServer = self.server
+        server.requests += 1
+        body = server.page
+        headers = {"Content-Type": "text/html; charset=utf-8"}
+        if server.compress and "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = server.gzipped()
+            headers["Content-Encoding"] = "gzip"
+        if server.content_length:
+            headers["Content-Length"] = str(len(body))
+
+        self.send_response(server.status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        try:
+            # 少しずつ書き出して、クライアント側の途中打ち切りが効くようにする
+            for i in range(0, len(body), 8192):
+                self.wfile.write(body[i : i + 8192])
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FanclubServer(ThreadingHTTPServer):
+    """127.0.0.1 の空きポートで page を返す HTTP サーバー（with 文で起動・停止）"""
+
+    daemon_threads = True
+
+    def __init__(self, page: bytes | None = None, compress: bool = True, content_length: bool = True):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.page = page if page is not None else make_homepage()
+        self.compress = compress
+        self.content_length = content_length
+        self.status = 200
+        self.requests = 0
+        self._gzip_cache: tuple[bytes | None, bytes] = (None, b"")
+        self._thread = threading.Thread(
+            target=self.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True
+        )
+
+    def gzipped(self) -> bytes:
+        # 圧縮はページ毎に 1 回だけ行い、計測にサーバー側の圧縮時間を含めない
+        if self._gzip_cache[0] is not self.page:
+            self._gzip_cache = (self.page, gzip.compress(self.page, compresslevel=6))
+        return self._gzip_cache[1]
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def __enter__(self) -> "FanclubServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,117 @@
+import gzip
+import pathlib
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from hiyolabbot import archive
+from hiyolabbot.item_index import ItemIndex
+
+
+class TestArchive(unittest.TestCase):
+    def setUp(self):
+        self.dir = pathlib.Path(tempfile.mkdtemp()) / "archive"
+        patcher = patch.object(archive, "ARCHIVE_DIR", self.dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(archive.close_segments)
+
+    def _record_cycles(self):
+        snaps = [
+            {"INFORMATION": ["/news/10001"], "BLOG": []},
+            {"INFORMATION": ["/news/10001"], "BLOG": []},
+            {"INFORMATION": ["/news/10002", "/news/10001"], "BLOG": ["/blog/20001"]},
+            {"INFORMATION": ["/news/10002"], "BLOG": ["/blog/20001"]},
+            # 一度消えた項目が再掲されても初出とはみなさない
+            {"INFORMATION": ["/news/10002", "/news/10001"], "BLOG": ["/blog/20001"]},
+        ]
+        index = ItemIndex()
+        for i, snap in enumerate(snaps):
+            new_ids = index.new_items(snap) if index.initialized else None
+            archive.record_observation("public", 1000.0 + 60 * i, 0.5, snap, new_ids)
+            index.update(snap)
+
+    def test_record_and_iterate(self):
+        """観測結果が gzip 圧縮された JSONL として追記される"""
+        self._record_cycles()
+        observations = list(archive.iter_observations())
+        self.assertEqual(len(observations), 5)
+        self.assertTrue(observations[0]["initial"])
+        self.assertEqual(
+            observations[2]["new_ids"],
+            {"INFORMATION": ["/news/10002"], "BLOG": ["/blog/20001"]},
+        )
+        self.assertEqual(observations[0]["hash"], observations[1]["hash"])
+        # 閉じたセグメントは通常の gzip ファイルとして読める
+        archive.close_segments()
+        with gzip.open(self.dir / archive.CURRENT_SEGMENT, "rt") as f:
+            self.assertEqual(len(f.readlines()), 5)
+
+    def test_compression_ratio(self):
+        """行毎にフラッシュしても 1 本のストリームとして圧縮される"""
+        raw = 0
+        for i in range(2000):
+            snap = {"talk_comments": [str(5000 + j) for j in range(i % 7)]}
+            observation = archive.record_observation(
+                "talk", 1000.0 + 60 * i, 0.012, snap, {}
+            )
+            raw += len(archive.json.dumps(observation, ensure_ascii=False).encode()) + 1
+        size = (self.dir / archive.CURRENT_SEGMENT).stat().st_size
+        self.assertLess(size, raw / 5, f"{size}B for {raw}B of JSONL")
+        self.assertEqual(len(list(archive.iter_observations())), 2000)
+
+    def test_append_after_restart(self):
+        """終端済みのセグメントには続けて追記し、終端されていなければローテーションする"""
+        self._record_cycles()
+        archive.close_segments()
+        self._record_cycles()
+        self.assertEqual(len(archive.segments()), 1)
+        self.assertEqual(len(list(archive.iter_observations())), 10)
+
+        # 強制終了などでストリームが終端されなかった場合
+        archive._writers.clear()
+        self._record_cycles()
+        self.assertEqual(len(archive.segments()), 2)
+        self.assertEqual(len(list(archive.iter_observations())), 15)
+
+    def test_first_seen_between(self):
+        """期間内に初めて観測された項目だけが返る"""
+        self._record_cycles()
+        items = list(archive.first_seen(1060.0, 1300.0))
+        self.assertEqual(
+            items,
+            [
+                (1120.0, "public", "INFORMATION", "/news/10002"),
+                (1120.0, "public", "BLOG", "/blog/20001"),
+            ],
+        )
+        self.assertEqual(list(archive.first_seen(1000.0, 1060.0))[0][3], "/news/10001")
+
+    def test_detection_latencies(self):
+        """新着を検出したサイクルだけ、直前の観測からの経過時間が返る"""
+        self._record_cycles()
+        self.assertEqual(archive.detection_latencies(), [60.5, 60.5])
+        summary = archive.latency_summary(archive.detection_latencies())
+        self.assertEqual(summary["count"], 2)
+        self.assertEqual(summary["p50"], 60.5)
+        self.assertEqual(archive.latency_summary([]), {"count": 0})
+
+    def test_rotation_keeps_order(self):
+        """サイズ上限でローテーションしても古い順に読める"""
+        with patch.object(archive, "ARCHIVE_MAX_BYTES", 1):
+            self._record_cycles()
+        self.assertEqual(len(archive.segments()), 5)
+        self.assertEqual(archive.segments()[-1].name, archive.CURRENT_SEGMENT)
+        ts = [o["ts"] for o in archive.iter_observations()]
+        self.assertEqual(ts, sorted(ts))
+
+    def test_truncated_tail_is_skipped(self):
+        """書き込み途中で途切れた末尾は読み飛ばされる"""
+        self._record_cycles()
+        with (self.dir / archive.CURRENT_SEGMENT).open("ab") as f:
+            f.write(gzip.compress(b'{"ts": 2000.0}\n')[:10])
+        self.assertEqual(len(list(archive.iter_observations())), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
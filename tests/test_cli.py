@@ -0,0 +1,86 @@
+import io
+import pathlib
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from unittest.mock import patch
+
+from hiyolabbot import archive, cli, watcher
+
+PAGE_1 = '''
+<section id="news"><a href="/news/detail/12445">お知らせ1</a></section>
+<section id="blog"><a href="/blog/detail/20001">ブログ1</a></section>
+'''
+PAGE_2 = '''
+<section id="news"><a href="/news/detail/12445">お知らせ1</a></section>
+<section id="blog">
+    <a href="/blog/detail/20002">ブログ2</a>
+    <a href="/blog/detail/20001">ブログ1</a>
+</section>
+'''
+
+
+def _fetched(html):
+    stats = watcher.FetchStats(watcher.URL, 200, "identity", len(html), len(html), 0.0, False)
+    return watcher.parse_html(html), stats
+
+
+class TestCli(unittest.TestCase):
+    def setUp(self):
+        self.tmp = pathlib.Path(tempfile.mkdtemp())
+
+    def test_replay_reports_changed_pages(self):
+        """記録済みページの再生で新着のあったページだけが表示される"""
+        (self.tmp / "0001.html").write_text(PAGE_1, encoding="utf-8")
+        (self.tmp / "0002.html").write_text(PAGE_1, encoding="utf-8")
+        (self.tmp / "0003.html").write_text(PAGE_2, encoding="utf-8")
+
+        out = io.StringIO()
+        with redirect_stdout(out):
+            status = cli.main(["replay", str(self.tmp)])
+
+        self.assertEqual(status, cli.EXIT_OK)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0], "0003.html: BLOG")
+        self.assertTrue(lines[1].startswith("3 pages, 1 with changes"))
+
+    def test_replay_missing_directory(self):
+        """存在しないディレクトリはエラー終了する"""
+        status = cli.main(["replay", str(self.tmp / "missing")])
+        self.assertEqual(status, cli.EXIT_ERROR)
+
+    def test_check_exit_codes(self):
+        """初回は 0、新着ありで 1、--commit を付けた場合だけスナップショットを更新する"""
+        snapshot_file = self.tmp / "snapshot.json"
+        pages = iter([PAGE_1, PAGE_1, PAGE_2, PAGE_2, PAGE_2])
+        with patch.object(watcher, "SNAPSHOT_FILE", snapshot_file), patch.object(
+            archive, "ARCHIVE_DIR", self.tmp / "archive"
+        ), patch.object(
+            watcher, "fetch_page", side_effect=lambda: _fetched(next(pages))
+        ), redirect_stdout(io.StringIO()):
+            self.assertEqual(cli.main(["check"]), cli.EXIT_OK)
+            self.assertFalse(snapshot_file.exists())
+            self.assertEqual(cli.main(["check", "--commit"]), cli.EXIT_OK)
+            # 通知しない check では新着を既出にしない
+            self.assertEqual(cli.main(["check"]), cli.EXIT_CHANGED)
+            self.assertEqual(cli.main(["check"]), cli.EXIT_CHANGED)
+            self.assertEqual(watcher.load_previous()["BLOG"], ["/blog/detail/20001"])
+            self.assertEqual(cli.main(["check", "--commit"]), cli.EXIT_CHANGED)
+            self.assertEqual(
+                watcher.load_previous()["BLOG"],
+                ["/blog/detail/20002", "/blog/detail/20001"],
+            )
+            # --commit のサイクルだけがアーカイブに記録される
+            self.assertEqual(len(list(archive.iter_observations())), 2)
+        archive.close_segments()
+
+    def test_check_reports_fetch_error(self):
+        """取得に失敗した場合は 2 で終了する"""
+        with patch.object(
+            watcher, "fetch_page", side_effect=watcher.requests.ConnectionError("down")
+        ), redirect_stdout(io.StringIO()), patch("sys.stderr", io.StringIO()):
+            self.assertEqual(cli.main(["check"]), cli.EXIT_ERROR)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+
+from hiyolabbot.item_index import ItemIndex
+
+
+class TestItemIndex(unittest.TestCase):
+    def test_new_items_keeps_order_and_strings(self):
+        """新着 ID は元の文字列のまま curr の順序で返る"""
+        index = ItemIndex.from_snapshot(
+            {"INFORMATION": ["/news/12445", "/news/12444"], "BLOG": []}
+        )
+        curr = {
+            "INFORMATION": ["/news/12447", "/news/12445", "/news/12446"],
+            "BLOG": ["/blog/30001"],
+            "MOVIE": [],
+        }
+        self.assertEqual(
+            index.new_items(curr),
+            {"INFORMATION": ["/news/12447", "/news/12446"], "BLOG": ["/blog/30001"]},
+        )
+
+    def test_update_replaces_contents(self):
+        """update 後は今回のスナップショットだけが既出として扱われる"""
+        index = ItemIndex()
+        self.assertFalse(index.initialized)
+        index.update({"INFORMATION": ["/news/12445", "/news/12444"]})
+        self.assertTrue(index.initialized)
+        self.assertEqual(len(index), 2)
+
+        index.update({"INFORMATION": ["/news/12445"]})
+        self.assertTrue(index.contains("INFORMATION", "/news/12445"))
+        self.assertFalse(index.contains("INFORMATION", "/news/12444"))
+        self.assertFalse(index.contains("BLOG", "/news/12445"))
+
+    def test_same_number_with_different_prefix(self):
+        """末尾の数字が同じでも href の前の部分が違えば新着として扱う"""
+        index = ItemIndex.from_snapshot({"INFORMATION": ["/news/detail/12345"]})
+        curr = {"INFORMATION": ["/live/detail/12345", "/news/detail/12345"]}
+        self.assertEqual(index.new_items(curr), {"INFORMATION": ["/live/detail/12345"]})
+        self.assertTrue(index.contains("INFORMATION", "/news/detail/12345"))
+        self.assertFalse(index.contains("INFORMATION", "/live/detail/12345"))
+
+    def test_numeric_ids(self):
+        """トークのように数字だけの ID は整数配列で保持する"""
+        index = ItemIndex.from_snapshot({"talk_comments": ["100", "99"]}, numeric=True)
+        self.assertEqual(index.nbytes, 16)
+        curr = {"talk_comments": ["99", "100", "101"]}
+        self.assertEqual(index.new_items(curr), {"talk_comments": ["101"]})
+        index.update(curr)
+        self.assertTrue(index.contains("talk_comments", "101"))
+        self.assertEqual(index.new_items(curr), {})
+        with self.assertRaises(ValueError):
+            ItemIndex.from_snapshot({"talk_comments": ["comment"]}, numeric=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+import asyncio
+import contextlib
+import io
+import pathlib
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+import discord
+from fakes import FakeInteraction, WatchHarness, quiet_logging
+
+from hiyolabbot import main
+
+
+class FakeLoop:
+    """client.loop の代わり。create_task の呼び出しを events に記録する"""
+
+    def __init__(self, events: list[str]):
+        self.events = events
+
+    def create_task(self, coro):
+        self.events.append("watch_task")
+        return asyncio.get_running_loop().create_task(coro)
+
+
+class FakeClient:
+    """discord.Client の代わり。is_closed は closed の値を順に返す"""
+
+    def __init__(self, events: list[str] | None = None, closed=()):
+        self.user = MagicMock(id=1)
+        self.loop = FakeLoop(events if events is not None else [])
+        self._closed = iter(closed)
+
+    async def wait_until_ready(self) -> None:
+        pass
+
+    def is_closed(self) -> bool:
+        return next(self._closed, True)
+
+
+class FakeTree:
+    """app_commands.CommandTree の代わり。errors を順に送出してから成功する"""
+
+    def __init__(self, events: list[str], errors=()):
+        self.events = events
+        self.errors = list(errors)
+
+    async def sync(self) -> None:
+        self.events.append("sync")
+        if self.errors:
+            raise self.errors.pop(0)
+
+
+class TestMain(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.harness = WatchHarness(pathlib.Path(tempfile.mkdtemp()))
+        for name, value in (("_monitor", None), ("_watch_task", None), ("_commands_synced", False)):
+            patcher = patch.object(main, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def test_commands_before_monitor_is_ready(self):
+        """Monitor ができる前はどのコマンドも起動中と返す"""
+        for command in (main.check_command, main.status_command, main.stats_command):
+            interaction = FakeInteraction()
+            await command.callback(interaction)
+            self.assertEqual(interaction.sent, [("response", "まだ起動中です", True)])
+
+    async def test_check_command(self):
+        """/check は応答を保留してサイクルを実行し、結果をフォローアップで返す"""
+        main._monitor = self.harness.monitor
+        interaction = FakeInteraction()
+        with quiet_logging():
+            await main.check_command.callback(interaction)
+
+        self.assertEqual([kind for kind, _, _ in interaction.sent], ["defer", "followup"])
+        self.assertIn("サイクル完了（manual", interaction.sent[1][1])
+        self.assertEqual(self.harness.monitor.stats.manual_cycles, 1)
+
+    async def test_check_command_always_follows_up(self):
+        """サイクルが例外を送出しても「考え中…」のまま残さない"""
+        main._monitor = self.harness.monitor
+        interaction = FakeInteraction()
+        with patch.object(
+            self.harness.monitor, "request_cycle", side_effect=RuntimeError("boom")
+        ):
+            await main.check_command.callback(interaction)
+
+        self.assertEqual(
+            interaction.sent[-1], ("followup", "チェック中にエラーが発生しました: boom", True)
+        )
+
+    async def test_status_and_stats_commands(self):
+        """/status と /stats はメモリ上の状態から応答する"""
+        main._monitor = self.harness.monitor
+        await self.harness.run(2)
+        status, stats = FakeInteraction(), FakeInteraction()
+        await main.status_command.callback(status)
+        await main.stats_command.callback(stats)
+
+        self.assertIn("前回のサイクル", status.sent[0][1])
+        self.assertIn("サイクル: 2回", stats.sent[0][1])
+        self.assertTrue(status.sent[0][2] and stats.sent[0][2])
+
+    async def test_on_ready_starts_watch_before_sync_and_retries(self):
+        """監視はコマンドの同期より先に始まり、同期の失敗は次の on_ready で再試行する"""
+        events: list[str] = []
+        started = asyncio.Event()
+        stop = asyncio.Event()
+
+        async def watch_loop():
+            started.set()
+            await stop.wait()
+
+        tree = FakeTree(events, errors=[discord.ClientException("missing scope")])
+        with patch.object(main, "client", FakeClient(events)), patch.object(
+            main, "tree", tree
+        ), patch.object(main, "watch_loop", watch_loop), contextlib.redirect_stdout(io.StringIO()):
+            await main.on_ready()
+            self.assertEqual(events, ["watch_task", "sync"])
+            self.assertFalse(main._commands_synced)
+            await asyncio.wait_for(started.wait(), 1)
+
+            # 再接続: 監視は動いたまま、同期だけ再試行する
+            await main.on_ready()
+            self.assertEqual(events, ["watch_task", "sync", "sync"])
+            self.assertTrue(main._commands_synced)
+
+            # 同期済みなら再度同期しない
+            await main.on_ready()
+            self.assertEqual(events, ["watch_task", "sync", "sync"])
+            stop.set()
+            await main._watch_task
+
+    async def test_watch_loop_reuses_monitor(self):
+        """on_ready で再起動された監視ループは同じ Monitor を使い、統計を引き継ぐ"""
+        create_monitor = MagicMock(return_value=self.harness.monitor)
+        with patch.object(main, "_create_monitor", create_monitor), quiet_logging():
+            with patch.object(main, "client", FakeClient(closed=[False, True])):
+                await main.watch_loop()
+            with patch.object(main, "client", FakeClient(closed=[False, True])):
+                await main.watch_loop()
+
+        create_monitor.assert_called_once()
+        self.assertIs(main._monitor, self.harness.monitor)
+        self.assertEqual(self.harness.monitor.stats.cycles, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
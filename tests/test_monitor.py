@@ -0,0 +1,119 @@
+import asyncio
+import pathlib
+import tempfile
+import threading
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from hiyolabbot import monitor, talk_watcher
+from hiyolabbot.archive import Observation
+from hiyolabbot.item_index import ItemIndex
+
+
+def _observation(changes):
+    return Observation("public", 0.0, 0.0, {}, {}, changes)
+
+
+class TestMonitor(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.channel = AsyncMock()
+        self.dev_channel = AsyncMock()
+        self.x_client = MagicMock()
+        self.broadcast_line = MagicMock()
+        self.check_public = MagicMock()
+        self.commit_public = MagicMock()
+
+    def _monitor(self):
+        return monitor.Monitor(
+            self.channel,
+            self.dev_channel,
+            self.x_client,
+            self.broadcast_line,
+            check_public=self.check_public,
+            commit_public=self.commit_public,
+            index=ItemIndex(),
+            talk_index=ItemIndex(),
+        )
+
+    async def test_concurrent_requests_share_one_cycle(self):
+        """定期実行中の手動要求は同じサイクルの結果を共有する"""
+        release = threading.Event()
+        calls = []
+
+        def check_updates(index):
+            calls.append(index)
+            release.wait(5)
+            return _observation(["BLOG"])
+
+        self.check_public.side_effect = check_updates
+        self.monitor = self._monitor()
+        scheduled = asyncio.create_task(self.monitor.request_cycle("scheduled"))
+        await asyncio.sleep(0.01)
+        manual = asyncio.create_task(self.monitor.request_cycle("manual"))
+        await asyncio.sleep(0.01)
+        self.assertIsNotNone(self.monitor.running)
+        self.assertEqual(self.monitor.waiting, 2)
+        self.assertIn("待機中の要求 2件", self.monitor.describe_status())
+        release.set()
+        first, second = await asyncio.gather(scheduled, manual)
+
+        self.assertIs(first, second)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(first.trigger, "scheduled")
+        self.assertEqual(first.changes, ["BLOG"])
+        self.assertEqual(self.monitor.stats.cycles, 1)
+        self.assertEqual(self.monitor.stats.shared_requests, 1)
+        self.assertEqual(self.monitor.waiting, 0)
+        self.channel.send.assert_awaited_once()
+        self.x_client.create_tweet.assert_called_once()
+        self.broadcast_line.assert_called_once()
+        self.commit_public.assert_called_once()
+
+    async def test_fetch_error_is_reported(self):
+        """取得エラーは開発用チャンネルに送られ、統計に反映される"""
+        self.check_public.side_effect = monitor.requests.ConnectionError("down")
+        self.monitor = self._monitor()
+        result = await self.monitor.request_cycle("manual")
+
+        self.assertEqual(result.errors, ["HTMLの取得に失敗しました: down"])
+        self.dev_channel.send.assert_awaited_once_with("HTMLの取得に失敗しました: down")
+        self.channel.send.assert_not_awaited()
+        self.commit_public.assert_not_called()
+        self.assertEqual(self.monitor.stats.failed_cycles, 1)
+        self.assertEqual(self.monitor.stats.manual_cycles, 1)
+        self.assertIn("エラー: 1件", self.monitor.describe_result(result))
+        self.assertIn("エラーのあったサイクル: 1回", self.monitor.describe_stats())
+
+    async def test_failed_send_is_not_committed(self):
+        """Discord への送信に失敗した新着は既出として保存しない"""
+        self.check_public.return_value = _observation(["BLOG"])
+        self.channel.send.side_effect = RuntimeError("503 Service Unavailable")
+        self.dev_channel.send.side_effect = RuntimeError("503 Service Unavailable")
+        self.monitor = self._monitor()
+        with self.assertLogs(level="ERROR"):
+            result = await self.monitor.request_cycle("scheduled")
+
+        self.assertEqual(result.errors, ["Discord への通知に失敗しました: 503 Service Unavailable"])
+        self.commit_public.assert_not_called()
+        self.x_client.create_tweet.assert_not_called()
+        self.assertEqual(self.monitor.stats.failed_cycles, 1)
+        self.assertEqual(self.monitor.stats.notifications, 0)
+
+    async def test_corrupted_talk_snapshot_does_not_block_startup(self):
+        """トークのスナップショットが壊れていても Monitor は作れる"""
+        directory = pathlib.Path(tempfile.mkdtemp())
+        (directory / "talk_snapshot.json").write_text("{", encoding="utf-8")
+        with patch.object(talk_watcher, "TALK_SNAPSHOT_FILE", directory / "talk_snapshot.json"):
+            # 認証情報が無ければ読み込まない
+            with patch.object(monitor, "load_talk_index") as load_talk_index:
+                monitor.Monitor(self.channel, self.dev_channel, self.x_client,
+                                self.broadcast_line, index=ItemIndex())
+                load_talk_index.assert_not_called()
+            with self.assertLogs(level="WARNING"):
+                m = monitor.Monitor(self.channel, self.dev_channel, self.x_client,
+                                    self.broadcast_line, "id", "password", index=ItemIndex())
+        self.assertFalse(m.talk_index.initialized)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,27 +3,21 @@ import unittest
 from unittest.mock import Mock, patch, AsyncMock
 from pathlib import Path
 import tempfile
-import os
-
-# テスト用に一時ディレクトリを使用
-test_dir = tempfile.mkdtemp()
-os.chdir(test_dir)
 
 from src.hiyolabbot.talk_watcher import (
     make_talk_snapshot,
     diff_talk,
     load_talk_previous,
     save_talk_snapshot,
-    TALK_SNAPSHOT_FILE
+    load_talk_index,
 )
 
 
 class TestTalkWatcher(unittest.TestCase):
     
     def setUp(self):
-        # 各テストの前にスナップショットファイルを削除
-        if TALK_SNAPSHOT_FILE.exists():
-            TALK_SNAPSHOT_FILE.unlink()
+        # 各テストで一時ディレクトリのスナップショットファイルを使用
+        self.snapshot_file = Path(tempfile.mkdtemp()) / "talk_snapshot.json"
     
     def test_make_talk_snapshot(self):
         """スナップショット作成のテスト"""
@@ -58,6 +52,26 @@ class TestTalkWatcher(unittest.TestCase):
         result = diff_talk(prev, curr)
         self.assertEqual(result, ["新しいトーク: 2件のメッセージ"])
     
+    def test_corrupted_talk_snapshot(self):
+        """空・壊れたトークスナップショットは初回スキャンとして扱う"""
+        for text in ("", "{\"talk_comments\": ["):
+            self.snapshot_file.write_text(text, encoding="utf-8")
+            with self.assertLogs(level="WARNING"):
+                self.assertIsNone(load_talk_previous(self.snapshot_file))
+                self.assertFalse(load_talk_index(self.snapshot_file).initialized)
+    
+    def test_unindexable_talk_snapshot(self):
+        """数字でないコメント ID を含むスナップショットは初回スキャンとして扱う"""
+        self.snapshot_file.write_text(
+            json.dumps({"talk_comments": ["12345", "comment"]}), encoding="utf-8"
+        )
+        with self.assertLogs(level="WARNING"):
+            index = load_talk_index(self.snapshot_file)
+        self.assertFalse(index.initialized)
+        
+        changes = diff_talk({"talk_comments": ["comment"]}, {"talk_comments": ["12345"]})
+        self.assertEqual(changes, ["トーク初回スキャン（スナップショット作成）"])
+    
     def test_diff_talk_no_changes(self):
         """変更なしの場合のテスト"""
         prev = {"talk_comments": ["12345", "12346"]}
@@ -70,10 +84,10 @@ class TestTalkWatcher(unittest.TestCase):
         """スナップショットの保存と読み込みテスト"""
         snapshot = {"talk_comments": ["12345", "12346", "12347"]}
         
-        save_talk_snapshot(snapshot)
-        self.assertTrue(TALK_SNAPSHOT_FILE.exists())
+        save_talk_snapshot(snapshot, self.snapshot_file)
+        self.assertTrue(self.snapshot_file.exists())
         
-        loaded = load_talk_previous()
+        loaded = load_talk_previous(self.snapshot_file)
         self.assertEqual(loaded, snapshot)
     
     def test_diff_detection_after_new_talk(self):
@@ -81,27 +95,42 @@ class TestTalkWatcher(unittest.TestCase):
         # 初回スキャン
         initial_comment_ids = ["12345", "12346", "12347"]
         initial_snapshot = make_talk_snapshot(initial_comment_ids)
-        save_talk_snapshot(initial_snapshot)
+        save_talk_snapshot(initial_snapshot, self.snapshot_file)
         
         # 新しいトークが追加された状態をシミュレート
         updated_comment_ids = ["12345", "12346", "12347", "12348", "12349"]
         updated_snapshot = make_talk_snapshot(updated_comment_ids)
         
         # 差分を検出
-        prev = load_talk_previous()
+        prev = load_talk_previous(self.snapshot_file)
         changes = diff_talk(prev, updated_snapshot)
         
         # 2件の新しいメッセージが検出されることを確認
         self.assertEqual(changes, ["新しいトーク: 2件のメッセージ"])
         
         # 更新後のスナップショットを保存
-        save_talk_snapshot(updated_snapshot)
+        save_talk_snapshot(updated_snapshot, self.snapshot_file)
         
         # 再度同じ状態でチェックした場合、変更なしになることを確認
-        prev = load_talk_previous()
+        prev = load_talk_previous(self.snapshot_file)
         changes = diff_talk(prev, updated_snapshot)
         self.assertEqual(changes, [])
     
+
+
+class TestTalkWatcherPlaywright(unittest.IsolatedAsyncioTestCase):
+    """Playwright をモックしたトークページ取得のテスト"""
+    
+    def setUp(self):
+        self.snapshot_file = Path(tempfile.mkdtemp()) / "talk_snapshot.json"
+        # セッションファイルは一時ディレクトリに作る（存在しないのでログインから始まる）
+        patcher = patch(
+            'src.hiyolabbot.talk_watcher.SESSION_FILE',
+            self.snapshot_file.parent / "playwright_session.json",
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
     @patch('src.hiyolabbot.talk_watcher.async_playwright')
     async def test_extract_comment_ids(self, mock_playwright):
         """コメントID抽出のテスト"""
@@ -125,11 +154,10 @@ class TestTalkWatcher(unittest.TestCase):
         mock_p.chromium.launch.return_value = mock_browser
         mock_browser.new_context.return_value = mock_context
         mock_context.new_page.return_value = mock_page
+        mock_context.storage_state.return_value = {"cookies": [], "origins": []}
         
         # SESSION_FILE が存在しない場合のテスト
         from src.hiyolabbot.talk_watcher import extract_comment_ids, SESSION_FILE
-        if SESSION_FILE.exists():
-            SESSION_FILE.unlink()
         
         # テスト実行
         result = await extract_comment_ids("test_id", "test_password")
@@ -137,6 +165,8 @@ class TestTalkWatcher(unittest.TestCase):
         # アサーション
         self.assertEqual(result, ["12345", "12346", "12347"])
         mock_page.query_selector_all.assert_called_with('#chat-area ul li div p[id^="comment-body-"]')
+        mock_page.fill.assert_any_call('input[name="form[id]"]', "test_id")
+        self.assertTrue(SESSION_FILE.exists())
     
     @patch('src.hiyolabbot.talk_watcher.async_playwright')
     async def test_check_talk_updates_integration(self, mock_playwright):
@@ -161,12 +191,24 @@ class TestTalkWatcher(unittest.TestCase):
         mock_p.chromium.launch.return_value = mock_browser
         mock_browser.new_context.return_value = mock_context
         mock_context.new_page.return_value = mock_page
+        mock_context.storage_state.return_value = {"cookies": [], "origins": []}
         
-        from src.hiyolabbot.talk_watcher import check_talk_updates
+        from hiyolabbot import archive  # talk_watcher が書き込むのと同じモジュール
+        from src.hiyolabbot.talk_watcher import check_talk_updates, commit_talk_updates
+        self.addCleanup(archive.close_segments)
+        archive_dir = self.snapshot_file.parent / "archive"
         
         # 初回スキャン
-        changes = await check_talk_updates("test_id", "test_password")
-        self.assertEqual(changes, ["トーク初回スキャン（スナップショット作成）"])
+        observation = await check_talk_updates(
+            "test_id", "test_password", snapshot_file=self.snapshot_file
+        )
+        self.assertEqual(observation.changes, ["トーク初回スキャン（スナップショット作成）"])
+        commit_talk_updates(
+            observation, snapshot_file=self.snapshot_file, archive_dir=archive_dir
+        )
+        self.assertEqual(
+            load_talk_previous(self.snapshot_file), {"talk_comments": ["12345", "12346"]}
+        )
         
         # 新しいトークが追加された状態をシミュレート
         updated_elements = []
@@ -178,8 +220,23 @@ class TestTalkWatcher(unittest.TestCase):
         mock_page.query_selector_all.return_value = updated_elements
         
         # 2回目のスキャン
-        changes = await check_talk_updates("test_id", "test_password")
-        self.assertEqual(changes, ["新しいトーク: 1件のメッセージ"])
+        observation = await check_talk_updates(
+            "test_id", "test_password", snapshot_file=self.snapshot_file
+        )
+        self.assertEqual(observation.changes, ["新しいトーク: 1件のメッセージ"])
+        self.assertEqual(observation.new_ids, {"talk_comments": ["12347"]})
+        
+        # 保存していないので、同じ新着はもう一度検出される
+        observation = await check_talk_updates(
+            "test_id", "test_password", snapshot_file=self.snapshot_file
+        )
+        self.assertEqual(observation.changes, ["新しいトーク: 1件のメッセージ"])
+        commit_talk_updates(
+            observation, snapshot_file=self.snapshot_file, archive_dir=archive_dir
+        )
+        observations = list(archive.iter_observations("talk", directory=archive_dir))
+        self.assertEqual([o["initial"] for o in observations], [True, False])
+        self.assertEqual(observations[1]["new_ids"], {"talk_comments": ["12347"]})
 
 
 if __name__ == '__main__':
@@ -0,0 +1,181 @@
+import pathlib
+import tempfile
+import unittest
+
+import bench_index
+import requests
+from fakes import FakeFanclub, WatchHarness
+from fanclub_server import FanclubServer
+
+from hiyolabbot import archive, watcher
+
+
+class TestWatchLoop(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.dir = pathlib.Path(tempfile.mkdtemp())
+
+    async def test_initial_scan_is_silent(self):
+        """初回スキャンでは通知せず、スナップショットとアーカイブだけ作る"""
+        harness = WatchHarness(self.dir)
+        await harness.run(1)
+
+        self.assertEqual(harness.events, [])
+        self.assertTrue(harness.snapshot_file.exists())
+        observations = list(archive.iter_observations(directory=harness.archive_dir))
+        self.assertEqual(len(observations), 1)
+        self.assertTrue(observations[0]["initial"])
+
+    async def test_notification_order(self):
+        """新着は Discord → X → LINE の順に 1 回ずつ通知される"""
+        harness = WatchHarness(self.dir)
+
+        def between():
+            if harness.monitor.stats.cycles == 1:
+                harness.fanclub.publish("blog")
+
+        await harness.run(3, between=between)
+
+        self.assertEqual([name for name, _ in harness.events], ["channel", "x", "line"])
+        channel_msg = harness.notifications("channel")[0]
+        self.assertTrue(channel_msg.startswith("@everyone\n"))
+        self.assertIn("• BLOG", channel_msg)
+        self.assertIn("?t=", harness.notifications("x")[0])
+        self.assertEqual(harness.monitor.last_result.changes, [])
+        self.assertEqual(harness.monitor.stats.notifications, 1)
+
+    async def test_fetch_error_skips_talk_and_recovers(self):
+        """公開ページの取得エラーは開発用チャンネルに送られ、そのサイクルのトークは飛ばす"""
+        harness = WatchHarness(self.dir, talk=True)
+        await harness.run(1)
+        harness.fanclub.error = requests.ConnectionError("down")
+        await harness.run(1)
+
+        self.assertEqual(harness.notifications("dev"), ["HTMLの取得に失敗しました: down"])
+        self.assertEqual(harness.fanclub.talk_fetches, 1)
+
+        harness.fanclub.error = None
+        harness.fanclub.publish("news")
+        await harness.run(1)
+        self.assertIn("• INFORMATION", harness.notifications("channel")[0])
+        self.assertEqual(harness.fanclub.talk_fetches, 2)
+        self.assertEqual(harness.monitor.stats.failed_cycles, 1)
+
+    async def test_x_failure_still_broadcasts_line(self):
+        """X への投稿に失敗しても LINE には送られる"""
+        harness = WatchHarness(self.dir)
+        await harness.run(1)
+        harness.x_client.error = RuntimeError("duplicate content")
+        harness.fanclub.publish("photo")
+        await harness.run(1)
+
+        self.assertEqual([name for name, _ in harness.events], ["channel", "dev", "line"])
+        self.assertTrue(
+            harness.notifications("dev")[0].startswith("X に投稿に失敗しました: duplicate content")
+        )
+
+    async def test_talk_update(self):
+        """トークの新着は公開ページの後に通知される"""
+        harness = WatchHarness(self.dir, talk=True)
+        await harness.run(1)
+        harness.fanclub.publish("movie")
+        harness.fanclub.post_comment()
+        harness.fanclub.post_comment()
+        await harness.run(1)
+
+        self.assertEqual(
+            [name for name, _ in harness.events],
+            ["channel", "x", "line", "channel", "x", "line"],
+        )
+        self.assertIn("ひよりとーくが更新されました", harness.notifications("channel")[1])
+        self.assertEqual(
+            harness.monitor.last_result.talk_changes, ["新しいトーク: 2件のメッセージ"]
+        )
+
+    async def test_failed_send_is_retried(self):
+        """Discord への送信に失敗した新着は保存されず、次のサイクルで通知される"""
+        harness = WatchHarness(self.dir)
+        await harness.run(1)
+        harness.fanclub.publish("blog")
+        harness.channel.error = RuntimeError("503 Service Unavailable")
+        await harness.run(1)
+        self.assertEqual(
+            harness.notifications("dev"), ["Discord への通知に失敗しました: 503 Service Unavailable"]
+        )
+        self.assertEqual(harness.notifications("channel"), [])
+
+        harness.channel.error = None
+        await harness.run(2)
+        self.assertEqual(len(harness.notifications("channel")), 1)
+        self.assertIn("• BLOG", harness.notifications("channel")[0])
+        self.assertEqual(harness.monitor.stats.cycles, 4)
+
+    async def test_restart_resumes_from_saved_snapshot(self):
+        """再起動後は保存済みスナップショットから続き、初回扱いにならない"""
+        fanclub = FakeFanclub()
+        await WatchHarness(self.dir, fanclub=fanclub).run(2)
+        fanclub.publish("blog")
+
+        harness = WatchHarness(self.dir, fanclub=fanclub)
+        await harness.run(1)
+        self.assertEqual(len(harness.notifications("channel")), 1)
+        self.assertIn("• BLOG", harness.notifications("channel")[0])
+
+    async def test_many_cycles(self):
+        """1000 サイクルを実時間を待たずに回し、通知数・検出遅延を確認する"""
+        harness = WatchHarness(self.dir)
+        cycles = 1000
+
+        def between():
+            if harness.monitor.stats.cycles % 100 == 0:
+                harness.fanclub.publish("news")
+
+        await harness.run(cycles, interval=60, between=between)
+
+        self.assertEqual(harness.monitor.stats.cycles, cycles)
+        self.assertEqual(len(harness.notifications("channel")), cycles // 100 - 1)
+        self.assertEqual(harness.notifications("dev"), [])
+        latencies = archive.detection_latencies(directory=harness.archive_dir)
+        self.assertEqual(len(latencies), cycles // 100 - 1)
+        self.assertTrue(all(60 <= latency < 61 for latency in latencies))
+
+    def test_per_cycle_diff_cost(self):
+        """差分検出とインデックス更新が、以前のサイクル毎に読み込んで set の差を取る方法より遅くない
+
+        同じプロセス内で比べるので、マシンの速さに依存しない。
+        """
+        cases = [
+            ("public", *bench_index.public_snapshots(), False, 2000),
+            ("talk", *bench_index.talk_snapshots(20_000), True, 5),
+        ]
+        for name, prev, curr, numeric, number in cases:
+            with self.subTest(name):
+                times = bench_index.measure(prev, curr, numeric, number)
+                index = times["index new_items + update"]
+                baseline = times["baseline (load + set)"]
+                self.assertLess(
+                    index, 1.5 * baseline, f"{index * 1e6:.1f}us vs {baseline * 1e6:.1f}us"
+                )
+
+    async def test_over_http(self):
+        """ローカルのファンクラブ代替サーバーから実際に HTTP で取得する"""
+        fanclub = FakeFanclub(footer_bytes=50_000)
+        with FanclubServer(fanclub.render()) as server:
+            harness = WatchHarness(
+                self.dir, fanclub=fanclub, fetch=lambda: watcher.fetch_page(server.url)
+            )
+
+            def between():
+                if harness.monitor.stats.cycles == 2:
+                    fanclub.publish("blog")
+                    server.page = fanclub.render()
+
+            await harness.run(4, between=between)
+
+        self.assertEqual(server.requests, 4)
+        self.assertEqual(len(harness.notifications("channel")), 1)
+        observations = list(archive.iter_observations(directory=harness.archive_dir))
+        self.assertTrue(all(o["wire_bytes"] < o["body_bytes"] for o in observations))
+
+
+if __name__ == '__main__':
+    unittest.main()
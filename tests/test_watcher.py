@@ -1,10 +1,15 @@
 import hashlib
+import json
+import pathlib
 import re
+import tempfile
 import unittest
 from unittest.mock import MagicMock, patch
+import requests
 from bs4 import BeautifulSoup
 
 from hiyolabbot import watcher
+from fanclub_server import FanclubServer, make_homepage
 
 
 class TestWatcher(unittest.TestCase):
@@ -57,5 +62,71 @@ class TestWatcher(unittest.TestCase):
         changes = watcher.diff(snap_prev, snap_curr)
         self.assertIn("INFORMATION", changes)
 
+    def test_snapshot_with_non_detail_links(self):
+        """末尾が数字でない ID を含む古いスナップショットもそのまま比較できる"""
+        prev = {"INFORMATION": ["/news/12445", "/news/"], "BLOG": []}
+        curr = {"INFORMATION": ["/news/12445"], "BLOG": []}
+        self.assertEqual(watcher.diff(prev, curr), [])
+
+    def test_unindexable_snapshot_is_initial_scan(self):
+        """インデックスを作れないスナップショットは初回スキャンとして扱う"""
+        snapshot_file = pathlib.Path(tempfile.mkdtemp()) / "snapshot.json"
+        snapshot_file.write_text(json.dumps({"INFORMATION": [["/news/12445"]]}), encoding="utf-8")
+        with self.assertLogs(level="WARNING"):
+            index = watcher.load_index(snapshot_file)
+        self.assertFalse(index.initialized)
+
+    def test_diff_same_number_with_different_path(self):
+        """末尾の数字が同じでもパスが違うリンクは新着として検出する"""
+        prev = {"INFORMATION": ["/news/detail/12345"]}
+        curr = {"INFORMATION": ["/live/detail/12345", "/news/detail/12345"]}
+        self.assertEqual(watcher.diff(prev, curr), ["INFORMATION"])
+
+
+class TestFetchPage(unittest.TestCase):
+    def test_gzip_and_stop_early(self):
+        """gzip で受信し、全セクションを読んだ時点で打ち切る"""
+        page = make_homepage()
+        with FanclubServer(page) as server:
+            soup, stats = watcher.fetch_page(server.url)
+
+        self.assertEqual(stats.status, 200)
+        self.assertEqual(stats.content_encoding, "gzip")
+        self.assertTrue(stats.stopped_early)
+        self.assertLess(stats.body_bytes, len(page))
+        self.assertLess(stats.wire_bytes, stats.body_bytes)
+        snap = watcher.make_snapshot(soup)
+        self.assertEqual(len(snap["PHOTO"]), 12)
+        self.assertEqual(snap["INFORMATION"][0], "/news/detail/100000")
+
+    def test_full_read_matches_stop_early(self):
+        """打ち切らずに全体を読んだ場合と同じスナップショットになる"""
+        page = make_homepage()
+        with FanclubServer(page, compress=False) as server:
+            full, full_stats = watcher.fetch_page(server.url, stop_early=False)
+            early, _ = watcher.fetch_page(server.url)
+
+        self.assertEqual(full_stats.content_encoding, "identity")
+        self.assertEqual(full_stats.body_bytes, len(page))
+        self.assertFalse(full_stats.stopped_early)
+        self.assertEqual(watcher.make_snapshot(full), watcher.make_snapshot(early))
+
+    def test_body_size_guard(self):
+        """本文が上限を超えたら ResponseTooLarge（RequestException）になる"""
+        page = make_homepage(footer_bytes=200_000)
+        for content_length in (True, False):
+            with FanclubServer(page, compress=False, content_length=content_length) as server, \
+                    patch.object(watcher, "MAX_BODY_BYTES", 100_000):
+                with self.assertRaises(requests.exceptions.RequestException):
+                    watcher.fetch_page(server.url, stop_early=False)
+
+    def test_http_error(self):
+        """HTTP エラーは従来どおり例外になる"""
+        with FanclubServer() as server:
+            server.status = 503
+            with self.assertRaises(requests.exceptions.HTTPError):
+                watcher.fetch_page(server.url)
+
+
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file